@@ -0,0 +1,33 @@
+import json
+
+import board
+import digitalio
+import storage
+import usb_cdc
+
+# Keep the serial console and add a second CDC interface (usb_cdc.data)
+# used by code.py for the slot upload protocol (lib/slot_protocol.py).
+# Changes to this file take effect after a hard reset.
+usb_cdc.enable(console=True, data=True)
+
+
+def slot_log_enabled():
+    """Check config.json for "slot_log": true"""
+    try:
+        with open("/config.json", "r", encoding="utf-8") as f:
+            return json.load(f).get("slot_log", False) is True
+    except (OSError, ValueError, AttributeError):
+        return False
+
+
+# With the slot log enabled, code.py needs write access for /slots.log, which
+# makes the drive read-only for the host. Holding the Send button (GP14) while
+# plugging in keeps the drive writable from the host instead, e.g. to turn
+# the option off again.
+send_button = digitalio.DigitalInOut(board.GP14)
+send_button.switch_to_input(pull=digitalio.Pull.UP)
+send_held = not send_button.value
+send_button.deinit()
+
+if slot_log_enabled() and not send_held:
+    storage.remount("/", readonly=False)
@@ -1,13 +1,131 @@
 import time
+
+# Boot stage timing starts before the remaining imports
+BOOT_START_NS = time.monotonic_ns()
+boot_stages = []
+
+def mark_boot_stage(stage):
+    """Record the completion time of a boot stage"""
+    boot_stages.append((stage, time.monotonic_ns()))
+
 import board
 import digitalio
 import usb_hid
 import json
+import os
+import struct
+import sys
 from adafruit_hid.keyboard import Keyboard
 from adafruit_hid.keyboard_layout_us import KeyboardLayoutUS
 from adafruit_hid.keycode import Keycode
+from adafruit_hid.mouse import Mouse
+from adafruit_hid.consumer_control import ConsumerControl
+from adafruit_hid.consumer_control_code import ConsumerControlCode
+from micropython import const
+
+try:
+    import supervisor
+except ImportError:
+    supervisor = None
+
+try:
+    import alarm
+except ImportError:
+    alarm = None
+
+try:
+    import microcontroller
+except ImportError:
+    microcontroller = None
+
+# Optional slot selection hardware (see 'slot_inputs' in config.json)
+try:
+    import keypad
+except ImportError:
+    keypad = None
+
+try:
+    import rotaryio
+except ImportError:
+    rotaryio = None
+
+# The slot data channel needs usb_cdc data enabled in boot.py and lib/slot_protocol.py
+try:
+    import usb_cdc
+    import slot_protocol
+except ImportError:
+    usb_cdc = None
+    slot_protocol = None
+
+# On-device slot writes are persisted by lib/slot_log.py when 'slot_log' is on
+try:
+    import slot_log
+except ImportError:
+    slot_log = None
+
+mark_boot_stage('imports')
 
 # Constants
+USB_POLL_INTERVAL = 0.01  # seconds between USB readiness checks during boot
+SLOT_COUNT = const(5)
+MAX_SLOT_UPLOAD = const(65536)  # largest slot accepted over the data channel
+SLOT_LOG_FILE = "/slots.log"
+SLOT_LOG_COMPACT_SIZE = const(16384)  # compact once the log is larger and mostly stale
+STREAM_BUFFER_SIZE = const(2048)  # fixed buffer for text streamed over the data channel
+COMPILED_CACHE_LIMIT = const(32768)  # bytecode bytes kept across cached slots
+
+# Settings a slot may override in its front-matter header
+SLOT_SETTING_KEYS = ('typing_delay', 'japanese_keyboard', 'enable_modifier_keys',
+                     'add_final_enter', 'flow_control', 'flow_control_key',
+                     'flow_control_chunk', 'profile', 'indent_mode', 'indent_width',
+                     'indent_tabs', 'auto_close', 'reindent_sequence', 'kana_mode',
+                     'ime_on_sequence', 'ime_off_sequence', 'transition_delays')
+FRONT_MATTER_MARKER = '---'
+
+# Macro bytecode opcodes (operands are single bytes or 16-bit little-endian)
+OP_TEXT = const(1)        # length16, ASCII bytes: literal run typed via a char table
+OP_KEY = const(2)         # keycode: press and release one key
+OP_CHORD = const(3)       # modifier bits, key count, keycodes: one press and one release report
+OP_DOWN = const(4)        # keycode: press and hold
+OP_UP = const(5)          # keycode: release a held key
+OP_DELAY = const(6)       # milliseconds16
+OP_REPEAT = const(7)      # count16: repeat the body up to the matching OP_END_REPEAT
+OP_END_REPEAT = const(8)
+OP_MOUSE_MOVE = const(9)  # step count, (x, y, wheel) signed bytes per step
+OP_MOUSE_CLICK = const(10)  # button bits: press and release
+OP_MOUSE_DOWN = const(11)   # button bits: press and hold
+OP_MOUSE_UP = const(12)     # button bits: release
+OP_CONSUMER = const(13)     # consumer control code16: press and release
+OP_PROFILE = const(14)      # profile index: switch the character table
+MAX_U16 = const(0xFFFF)
+MAX_REPEAT_DEPTH = const(8)
+MAX_MOUSE_STEP = const(127)
+
+# Send progress and cost model
+ESTIMATED_REPORT_NS = const(1000000)     # USB time per HID report (1 ms frame)
+PROGRESS_INTERVAL_NS = const(250000000)  # LED progress bar refresh cadence
+NO_PROGRESS_NS = 1 << 62                 # deadline that is never reached
+ESTIMATE_DISPLAY_SECONDS = (1, 5, 30, 120)  # dry-run LED thresholds
+
+# Keystroke transitions that get their own delay (see 'transition_delays')
+TRANSITION_CLASSES = ('plain', 'modifier', 'repeat', 'enter', 'command')
+
+# Telemetry counters in microcontroller.nvm (fixed little-endian layout)
+TELEMETRY_NVM_OFFSET = const(0)
+TELEMETRY_MAGIC = b'PCT1'
+TELEMETRY_FORMAT = '<4s11I'
+TELEMETRY_FIELDS = ('boot_count', 'boot_ms_total', 'sends_slot1', 'sends_slot2',
+                    'sends_slot3', 'sends_slot4', 'sends_slot5', 'chars_typed',
+                    'reports_sent', 'send_errors', 'chars_dropped')
+TELEMETRY_FLUSH_IDLE = 10  # seconds without activity before counters are written
+
+# Send checkpoint in microcontroller.nvm, after the telemetry block:
+# magic, slot, code length, code checksum, pc, text index, loop depth,
+# then (body pc, remaining count) for each open repeat
+CHECKPOINT_NVM_OFFSET = const(64)
+CHECKPOINT_MAGIC = b'PCK1'
+CHECKPOINT_FORMAT = '<4sBIIIIB' + 'IH' * MAX_REPEAT_DEPTH
+
 CONFIG_FILES = {
     'jis_keymap': '/jis_keymap.json',
     'function_keys': '/function_keys.json',
@@ -26,10 +144,70 @@ DEBUG_MESSAGES = {
 DEFAULT_CONFIG = {
     'startup_delay': 3,
     'typing_delay': 0.01,
+    # Delay after each keystroke by transition, in multiples of typing_delay:
+    # 'plain' for runs of ordinary keys, then the risky ones (a modifier
+    # change, the same key again, Enter, {command} keys). Classes left out
+    # count as 1, so {} types every keystroke at typing_delay
+    'transition_delays': {'plain': 0, 'modifier': 1, 'repeat': 1,
+                          'enter': 5, 'command': 3},
     'japanese_keyboard': False,
     'enable_modifier_keys': False,
-    'add_final_enter': False
+    'add_final_enter': False,
+    # Active keyboard profile ('' = none) and the available profiles: send
+    # settings plus key name overrides, e.g. {ctrl+c} as Command+C on a Mac
+    'profile': '',
+    'profiles': {
+        'us': {'japanese_keyboard': False},
+        'jis': {'japanese_keyboard': True},
+        'mac': {'japanese_keyboard': False, 'keys': {'ctrl': 'COMMAND'}}
+    },
+    # Editor transforms (need enable_modifier_keys): indent_mode 'keep',
+    # 'strip' (drop indentation, then type reindent_sequence at the end, e.g.
+    # "{shift+alt+f}") or 'relative' (the editor keeps the previous line's
+    # indentation; only the difference is typed). indent_tabs turns each
+    # indent_width spaces of indentation into a tab. auto_close lists bracket
+    # pairs the editor closes by itself, e.g. "()[]"
+    'indent_mode': 'keep',
+    'indent_width': 4,
+    'indent_tabs': False,
+    'auto_close': '',
+    'reindent_sequence': '',
+    # Type hiragana and katakana as romaji for the host IME. Each kana run is
+    # wrapped in ime_on_sequence / ime_off_sequence (need enable_modifier_keys),
+    # e.g. "{hankaku_zenkaku}" for both on Windows, or "{kana}" and "{eisu}" on
+    # a Mac. Kanji cannot be typed this way and are skipped
+    'kana_mode': False,
+    'ime_on_sequence': '',
+    'ime_off_sequence': '',
+    'flow_control': False,
+    'flow_control_key': 'scroll_lock',
+    'flow_control_chunk': 16,
+    'flow_control_timeout': 0.5,
+    'flow_control_target_rtt': 0.02,
+    'mouse_report_interval': 0.002,
+    'long_press_time': 1.0,
+    'idle_sleep_after': 60,
+    'profiling': False,
+    'checkpoint_nvm': False,
+    'checkpoint_interval': 5,
+    # Persist slots written over the data channel in /slots.log instead of
+    # keeping them in RAM until reboot. boot.py then makes the drive writable
+    # for the device (read-only for the host) unless Send is held at plug-in
+    'slot_log': False,
+    # Extra slot selection hardware, e.g.
+    #   {"type": "buttons", "pins": ["GP5", "GP6", "GP7"], "first_slot": 1}
+    #   {"type": "matrix", "rows": ["GP5", "GP6"], "columns": ["GP7", "GP8", "GP9"]}
+    #   {"type": "rotary", "pins": ["GP12", "GP13"], "divisor": 4}
+    'slot_inputs': []
+}
+
+# Lock keys usable for host-acknowledged flow control: (keycode, LED bit)
+FLOW_CONTROL_KEYS = {
+    'scroll_lock': (Keycode.SCROLL_LOCK, Keyboard.LED_SCROLL_LOCK),
+    'num_lock': (Keycode.KEYPAD_NUMLOCK, Keyboard.LED_NUM_LOCK)
 }
+FLOW_CONTROL_MIN_CHUNK = const(4)
+FLOW_CONTROL_MAX_CHUNK = const(256)
 
 # Utility functions
 def load_json_file(filepath, default_value=None):
@@ -66,8 +244,9 @@ def load_jis_keymap():
         for char, keycode_names in mappings.items():
             keycodes = []
             for name in keycode_names:
-                if hasattr(Keycode, name):
-                    keycodes.append(getattr(Keycode, name))
+                keycode = Keycode.from_name(name)
+                if keycode is not None:
+                    keycodes.append(keycode)
                 else:
                     print(f"[WARNING] Unknown keycode: {name}")
             if keycodes:
@@ -100,10 +279,23 @@ def load_function_keys():
     for category, mappings in func_data.items():
         if category == "valid_commands":
             valid_commands.update(mappings)
+        elif category == "mouse_buttons":
+            for command, button_name in mappings.items():
+                if hasattr(Mouse, button_name):
+                    MOUSE_BUTTON_MAP[command] = getattr(Mouse, button_name)
+                else:
+                    print(f"[WARNING] Unknown mouse button: {button_name}")
+        elif category == "consumer_keys":
+            for command, code_name in mappings.items():
+                if hasattr(ConsumerControlCode, code_name):
+                    CONSUMER_CODE_MAP[command] = getattr(ConsumerControlCode, code_name)
+                else:
+                    print(f"[WARNING] Unknown consumer control code: {code_name}")
         else:
             for command, keycode_name in mappings.items():
-                if hasattr(Keycode, keycode_name):
-                    keycode_map[command] = getattr(Keycode, keycode_name)
+                keycode = Keycode.from_name(keycode_name)
+                if keycode is not None:
+                    keycode_map[command] = keycode
                 else:
                     print(f"[WARNING] Unknown keycode: {keycode_name}")
     
@@ -129,10 +321,44 @@ def get_default_function_keys():
     valid_commands = {'enter', 'f1', 'ctrl', 'ctrl_down', 'ctrl_up'}
     return keycode_map, valid_commands
 
+def build_char_table(overrides=None):
+    """Build a (modifier bits, keycode) pair per ASCII code for the US layout,
+    with optional per-character keycode overrides (e.g. the JIS map)"""
+    table = bytearray(256)
+    ascii_keycodes = KeyboardLayoutUS.ASCII_TO_KEYCODE
+    shift_flag = KeyboardLayoutUS.SHIFT_FLAG
+    shift_bit = Keycode.modifier_bit(Keycode.SHIFT)
+    for code in range(128):
+        keycode = ascii_keycodes[code]
+        if keycode & shift_flag:
+            table[code * 2] = shift_bit
+            keycode &= ~shift_flag
+        table[code * 2 + 1] = keycode
+
+    if overrides:
+        for char, keycodes in overrides.items():
+            if len(char) != 1 or ord(char) > 127:
+                continue
+            modifiers = 0
+            keycode = 0
+            for code in keycodes:
+                bit = Keycode.modifier_bit(code)
+                if bit:
+                    modifiers |= bit
+                else:
+                    keycode = code
+            table[ord(char) * 2] = modifiers
+            table[ord(char) * 2 + 1] = keycode
+    return table
+
 # Load settings
 print("[INIT] Loading external configurations...")
+MOUSE_BUTTON_MAP = {}
+CONSUMER_CODE_MAP = {}
 JIS_KEYCODE_MAP = load_jis_keymap()
 FUNCTION_KEYCODE_MAP, VALID_COMMANDS = load_function_keys()
+US_CHAR_TABLE = build_char_table()
+JIS_CHAR_TABLE = build_char_table(JIS_KEYCODE_MAP)
 
 # Configuration loading function
 def load_config():
@@ -156,28 +382,22 @@ def load_config():
 print("[INIT] Loading configuration...")
 config = load_config()
 print("[INIT] Configuration loaded")
+mark_boot_stage('json_parse')
 
-# Initialize keyboard output
-print("[INIT] Initializing keyboard...")
-try:
-    keyboard = Keyboard(usb_hid.devices)
-    layout = KeyboardLayoutUS(keyboard)
-    print("[INIT] Keyboard initialization successful")
-except Exception as e:
-    print("[INIT ERROR] Keyboard initialization failed")
-    raise
+def create_button(pin):
+    """Configure a button input with pull-up (pressed reads False)"""
+    button = digitalio.DigitalInOut(pin)
+    button.direction = digitalio.Direction.INPUT
+    button.pull = digitalio.Pull.UP
+    return button
 
 print("[INIT] Setting up GPIO pins...")
 # Button GPIO configuration
 try:
-    button_next = digitalio.DigitalInOut(board.GP11)
-    button_next.direction = digitalio.Direction.INPUT
-    button_next.pull = digitalio.Pull.UP
+    button_next = create_button(board.GP11)
     print("[INIT] GP11 button configured")
 
-    button_send = digitalio.DigitalInOut(board.GP14)
-    button_send.direction = digitalio.Direction.INPUT
-    button_send.pull = digitalio.Pull.UP
+    button_send = create_button(board.GP14)
     print("[INIT] GP14 button configured")
 except Exception as e:
     print("[INIT ERROR] Button GPIO setup failed")
@@ -199,26 +419,615 @@ except Exception as e:
     print("[INIT ERROR] LED GPIO setup failed")
     raise
 
+class KeySelectInput:
+    """Direct slot selection from keypad.Keys or keypad.KeyMatrix: key N selects first_slot + N"""
+
+    def __init__(self, scanner, first_slot):
+        self.scanner = scanner
+        self.first_slot = first_slot
+        self.event = keypad.Event()
+
+    def poll(self, slot):
+        """Return the newly selected slot, or None"""
+        selected = None
+        while self.scanner.events.get_into(self.event):
+            if self.event.pressed:
+                selected = self.first_slot + self.event.key_number
+        return selected
+
+    def deinit(self):
+        self.scanner.deinit()
+
+class RotarySelectInput:
+    """Relative slot selection from a rotaryio encoder, wrapping around"""
+
+    def __init__(self, encoder):
+        self.encoder = encoder
+        self.position = encoder.position
+
+    def poll(self, slot):
+        """Return the newly selected slot, or None"""
+        position = self.encoder.position
+        steps = position - self.position
+        if not steps:
+            return None
+        self.position = position
+        return (slot - 1 + steps) % SLOT_COUNT + 1
+
+    def deinit(self):
+        self.encoder.deinit()
+
+def get_pin(name):
+    """Look up a board pin by name ("GP5")"""
+    pin = getattr(board, name, None)
+    if pin is None:
+        raise ValueError(f"Unknown pin: {name}")
+    return pin
+
+def create_slot_input(spec):
+    """Create a slot input from one 'slot_inputs' entry"""
+    input_type = spec.get('type')
+    if input_type in ('buttons', 'matrix'):
+        if keypad is None:
+            raise ValueError("keypad module not available")
+        if input_type == 'buttons':
+            scanner = keypad.Keys([get_pin(name) for name in spec['pins']],
+                                  value_when_pressed=False, pull=True)
+        else:
+            scanner = keypad.KeyMatrix([get_pin(name) for name in spec['rows']],
+                                       [get_pin(name) for name in spec['columns']])
+        return KeySelectInput(scanner, spec.get('first_slot', 1))
+    if input_type == 'rotary':
+        if rotaryio is None:
+            raise ValueError("rotaryio module not available")
+        pin_a, pin_b = spec['pins']
+        return RotarySelectInput(rotaryio.IncrementalEncoder(
+            get_pin(pin_a), get_pin(pin_b), divisor=spec.get('divisor', 4)))
+    raise ValueError(f"Unknown slot input type: {input_type}")
+
+# Slot selection inputs besides the Next button
+slot_inputs = []
+slot_input_specs = []
+for spec in config['slot_inputs']:
+    try:
+        slot_inputs.append(create_slot_input(spec))
+        slot_input_specs.append(spec)
+        print(f"[INIT] Slot input configured: {spec.get('type')}")
+    except Exception as e:
+        print(f"[WARNING] Slot input {spec} not configured: {e}")
+
+def poll_slot_inputs(slot):
+    """Return a slot chosen on any slot input, or None"""
+    selected = None
+    for slot_input in slot_inputs:
+        chosen = slot_input.poll(slot)
+        if chosen is not None:
+            selected = chosen
+    if selected is not None and not 1 <= selected <= SLOT_COUNT:
+        print(f"[WARNING] No slot {selected}")
+        return None
+    return selected
+
+def slot_input_wake_pins():
+    """Return the pin names of button slot inputs, or None if an input cannot wake the board"""
+    pins = []
+    for spec in slot_input_specs:
+        if spec.get('type') != 'buttons':
+            # A matrix or an encoder has no single pin level to wait for
+            return None
+        pins.extend(spec['pins'])
+    return pins
+
+mark_boot_stage('gpio')
+
+class Telemetry:
+    """Usage counters kept in RAM and flushed to microcontroller.nvm at idle.
+
+    Writing nvm erases a flash sector, so updates are batched and only
+    written when the packed counters actually changed.
+    """
+
+    def __init__(self, nvm):
+        self.nvm = nvm
+        self.size = struct.calcsize(TELEMETRY_FORMAT)
+        self.counters = [0] * len(TELEMETRY_FIELDS)
+        self.dirty = False
+        if nvm is None:
+            return
+        stored = struct.unpack(TELEMETRY_FORMAT,
+                               nvm[TELEMETRY_NVM_OFFSET:TELEMETRY_NVM_OFFSET + self.size])
+        if stored[0] == TELEMETRY_MAGIC:
+            self.counters = list(stored[1:])
+        else:
+            print("[TELEMETRY] No valid counters in nvm, starting from zero")
+
+    def add(self, field, amount=1):
+        """Increment a counter in RAM"""
+        self.counters[TELEMETRY_FIELDS.index(field)] += amount
+        self.dirty = True
+
+    def flush(self):
+        """Write changed counters to nvm"""
+        if not self.dirty or self.nvm is None:
+            return
+        packed = struct.pack(TELEMETRY_FORMAT, TELEMETRY_MAGIC,
+                             *[value & 0xFFFFFFFF for value in self.counters])
+        end = TELEMETRY_NVM_OFFSET + self.size
+        if self.nvm[TELEMETRY_NVM_OFFSET:end] != packed:
+            self.nvm[TELEMETRY_NVM_OFFSET:end] = packed
+            print("[TELEMETRY] Counters flushed to nvm")
+        self.dirty = False
+
+    def to_json(self):
+        """Export the counters as a JSON object"""
+        return json.dumps(dict(zip(TELEMETRY_FIELDS, self.counters)))
+
+telemetry = Telemetry(microcontroller.nvm if microcontroller else None)
+
+def wait_for_usb_ready(max_wait):
+    """Poll USB connection state, using max_wait only as an upper bound"""
+    if supervisor is None:
+        # No supervisor (e.g. Blinka): fall back to the fixed delay
+        time.sleep(max_wait)
+        return False
+    deadline = time.monotonic() + max_wait
+    while not supervisor.runtime.usb_connected:
+        if time.monotonic() >= deadline:
+            print(f"[INIT] USB not ready after {max_wait} seconds, continuing")
+            return False
+        time.sleep(USB_POLL_INTERVAL)
+    return True
+
+# Wait for the USB link (GPIO and configuration were set up while it came up)
+print("[INIT] Waiting for USB...")
+usb_ready = wait_for_usb_ready(config['startup_delay'])
+mark_boot_stage('usb_ready')
+
+# Initialize keyboard output
+print("[INIT] Initializing keyboard...")
+try:
+    keyboard = Keyboard(usb_hid.devices)
+    print("[INIT] Keyboard initialization successful")
+except Exception as e:
+    print("[INIT ERROR] Keyboard initialization failed")
+    raise
+
+# Mouse and consumer control are optional; macros using them fail to compile without them
+try:
+    mouse = Mouse(usb_hid.devices)
+except (ValueError, OSError):
+    mouse = None
+    print("[INIT] No mouse HID device")
+try:
+    consumer_control = ConsumerControl(usb_hid.devices)
+except (ValueError, OSError):
+    consumer_control = None
+    print("[INIT] No consumer control HID device")
+mark_boot_stage('hid_init')
+
 print("[INIT] Hardware initialization complete")
 
+def report_boot_timings():
+    """Print boot stage timings over serial"""
+    print("[BOOT] Stage timings:")
+    previous_ns = BOOT_START_NS
+    for stage, stage_ns in boot_stages:
+        print(f"[BOOT]   {stage}: {(stage_ns - previous_ns) / 1000000:.1f} ms "
+              f"(at {(stage_ns - BOOT_START_NS) / 1000000:.1f} ms)")
+        previous_ns = stage_ns
+    print(f"[BOOT] USB ready: {usb_ready}")
+
+def record_boot_telemetry():
+    """Count this boot and its duration"""
+    telemetry.add('boot_count')
+    telemetry.add('boot_ms_total', (boot_stages[-1][1] - BOOT_START_NS) // 1000000)
+
+def export_telemetry():
+    """Print the telemetry counters as JSON over serial"""
+    print("[TELEMETRY] " + telemetry.to_json())
+
+# Stages of the slot send pipeline timed by the profiler
+PROFILE_STAGES = ('read_file', 'normalize', 'front_matter', 'kana', 'extract_ascii',
+                  'convert_symbols', 'editor_transforms', 'compile', 'estimate',
+                  'first_report', 'hid_report', 'send')
+
+# Preallocated profile table: one row per stage
+profile_counts = [0] * len(PROFILE_STAGES)
+profile_total_ns = [0] * len(PROFILE_STAGES)
+profile_max_ns = [0] * len(PROFILE_STAGES)
+
+def record_span(index, elapsed_ns):
+    """Add one measurement to a row of the profile table"""
+    profile_counts[index] += 1
+    profile_total_ns[index] += elapsed_ns
+    if elapsed_ns > profile_max_ns[index]:
+        profile_max_ns[index] = elapsed_ns
+
+class ProfileSpan:
+    """Context manager timing one pipeline stage into the profile table.
+
+    A stage entered again while it is running (e.g. compiling an
+    {include:N} fragment inside a compile) is timed by the outer span only.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.start_ns = 0
+        self.depth = 0
+
+    def __enter__(self):
+        if not self.depth:
+            self.start_ns = time.monotonic_ns()
+        self.depth += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self.depth -= 1
+        if not self.depth:
+            record_span(self.index, time.monotonic_ns() - self.start_ns)
+        return False
+
+class NoProfile:
+    """Context manager that does nothing, used while profiling is off"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+NO_PROFILE = NoProfile()
+profile_spans = {stage: ProfileSpan(index) for index, stage in enumerate(PROFILE_STAGES)}
+
+def profile(stage):
+    """Return a context manager timing stage, or a no-op when profiling is off"""
+    if not config['profiling']:
+        return NO_PROFILE
+    return profile_spans[stage]
+
+def profile_reports(function, start_ns):
+    """Wrap a HID report function so each call is timed as 'hid_report'.
+
+    The first call is also recorded as 'first_report', measured from start_ns.
+    """
+    hid_report = profile_spans['hid_report']
+    pending = [start_ns]
+    def call(*args):
+        with hid_report:
+            result = function(*args)
+        if pending:
+            record_span(profile_spans['first_report'].index, time.monotonic_ns() - pending.pop())
+        return result
+    return call
+
+def dump_profile():
+    """Print the profile table over serial"""
+    if not config['profiling']:
+        print("[PROFILE] Profiling is off (set 'profiling' to true)")
+    print("[PROFILE] stage: count, total ms, mean us, max us")
+    for index, stage in enumerate(PROFILE_STAGES):
+        count = profile_counts[index]
+        if count:
+            print(f"[PROFILE]   {stage}: {count}, {profile_total_ns[index] / 1000000:.2f}, "
+                  f"{profile_total_ns[index] // count // 1000}, {profile_max_ns[index] // 1000}")
+
+# Commands accepted on the serial console while main() is running
+SERIAL_COMMANDS = {
+    'stats': export_telemetry,
+    'boot': report_boot_timings,
+    'profile': dump_profile
+}
+
+def poll_serial_command():
+    """Run a command typed on the serial console, if a line is waiting"""
+    if supervisor is None or not supervisor.runtime.serial_bytes_available:
+        return False
+    command = sys.stdin.readline().strip().lower()
+    if command in SERIAL_COMMANDS:
+        SERIAL_COMMANDS[command]()
+    elif command:
+        print(f"[SERIAL] Unknown command: {command} (available: {', '.join(SERIAL_COMMANDS)})")
+    return True
+
 current_slot = 1
 
+def normalize_text(content):
+    """Strip a BOM and normalize line endings"""
+    # Remove BOM if present
+    if content.startswith('\ufeff'):
+        content = content[1:]
+    # Normalize line endings
+    return content.replace('\r\n', '\n').replace('\r', '\n')
+
 def read_file(filepath):
     """Read text file with UTF-8 encoding and normalization"""
     try:
-        with open(filepath, "r", encoding="utf-8") as f:
-            content = f.read()
-            # Remove BOM if present
-            if content.startswith('\ufeff'):
-                content = content[1:]
-            # Normalize line endings
-            content = content.replace('\r\n', '\n').replace('\r', '\n')
-            debug_print('file_loaded')
-            return content
+        with profile('read_file'):
+            with open(filepath, "r", encoding="utf-8") as f:
+                content = f.read()
+        with profile('normalize'):
+            content = normalize_text(content)
+        debug_print('file_loaded')
+        return content
     except OSError:
         debug_print('file_failed')
         return None
 
+# Slots pushed over the data channel, by slot number. They take precedence
+# over /slotN.txt until reboot; None marks a slot deleted over the channel.
+slot_table = {}
+# Number of writes to each slot_table entry, identifying its current text
+slot_versions = {}
+
+def load_slot_store():
+    """Open the slot log and rebuild its index, if enabled"""
+    if not config['slot_log']:
+        return None
+    if slot_log is None:
+        print("[WARNING] slot_log is enabled but lib/slot_log.py is missing")
+        return None
+    try:
+        store = slot_log.SlotLog(SLOT_LOG_FILE, SLOT_LOG_COMPACT_SIZE)
+    except OSError as e:
+        print(f"[ERROR] Slot log load failed: {e}")
+        return None
+    print(f"[INIT] Slot log: {len(store.index)} slots, {store.size} bytes")
+    if store.torn:
+        print("[WARNING] Slot log ends in a damaged record; it is compacted on the next write")
+    return store
+
+# Slots written on the device, persisted across reboots (None when disabled).
+# They take precedence over /slotN.txt, and slot_table over them.
+slot_store = load_slot_store()
+
+def slot_filename(slot):
+    """Return the file backing a slot"""
+    return f"/slot{slot}.txt"
+
+def load_slot_text(slot):
+    """Return the text of a slot from the in-memory table, the slot log or its file"""
+    if slot in slot_table:
+        return slot_table[slot]
+    if slot_store and slot in slot_store:
+        data = slot_store.read(slot)
+        return None if data is None else data.decode('utf-8')
+    return read_file(slot_filename(slot))
+
+def write_slot(slot, text):
+    """Replace a slot's text (None deletes it).
+
+    With the slot log this is a single append; otherwise, or if the write
+    fails, the slot is kept in RAM until reboot.
+    """
+    if slot_store:
+        try:
+            if text is None:
+                slot_store.delete(slot)
+            else:
+                slot_store.put(slot, text.encode('utf-8'))
+            slot_table.pop(slot, None)
+            return
+        except OSError as e:
+            print(f"[WARNING] Slot log write failed, slot {slot} kept in RAM: {e}")
+    slot_table[slot] = text
+    slot_versions[slot] = slot_versions.get(slot, 0) + 1
+
+def compact_slot_log():
+    """Compact the slot log now (serial command)"""
+    if slot_store is None:
+        print("[STORE] Slot log is not enabled")
+        return
+    size = slot_store.size
+    try:
+        slot_store.compact()
+    except OSError as e:
+        print(f"[ERROR] Slot log compaction failed: {e}")
+        return
+    print(f"[STORE] Slot log compacted: {size} -> {slot_store.size} bytes")
+
+SERIAL_COMMANDS['compact'] = compact_slot_log
+
+def is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def setting_is_valid(key, value):
+    """Check a setting value against the type of its default"""
+    if key == 'profile':
+        return value == '' or value in KEYBOARD_PROFILES
+    if key == 'transition_delays':
+        return isinstance(value, dict) and all(
+            name in TRANSITION_CLASSES and is_number(delay) and delay >= 0
+            for name, delay in value.items())
+    if key == 'profiles':
+        return isinstance(value, dict) and all(
+            isinstance(spec, dict) for spec in value.values())
+    default_value = DEFAULT_CONFIG[key]
+    if isinstance(default_value, (bool, str, dict, list)):
+        return type(value) is type(default_value)
+    return is_number(value)
+
+def apply_config_changes(settings):
+    """Apply known settings to the running configuration (not persisted)"""
+    profiles = settings.get('profiles', config['profiles'])
+    for key, value in settings.items():
+        if key not in DEFAULT_CONFIG:
+            raise ValueError(f"Unknown setting: {key}")
+        if key == 'profile' and 'profiles' in settings:
+            # Checked against the profiles being installed
+            valid = value == '' or (isinstance(profiles, dict)
+                                    and value in [name.lower() for name in profiles])
+        else:
+            valid = setting_is_valid(key, value)
+        if not valid:
+            raise ValueError(f"Invalid value for {key}")
+    config.update(settings)
+    # Profile character tables follow japanese_keyboard unless they set it
+    if 'profiles' in settings or 'japanese_keyboard' in settings:
+        install_keyboard_profiles()
+    # Compiled slots depend on the configuration
+    compiled_slots.clear()
+    compiled_fragments.clear()
+    print(f"[LINK] Config updated: {', '.join(settings)}")
+
+def decode_utf8_lossy(data):
+    """Decode UTF-8, skipping invalid bytes; returns (text, skipped byte count)"""
+    parts = []
+    skipped = 0
+    position = 0
+    while position < len(data):
+        first = data[position]
+        size = 1 if first < 0x80 else 2 if first < 0xE0 else 3 if first < 0xF0 else 4
+        try:
+            parts.append(data[position:position + size].decode('utf-8'))
+            position += size
+        except UnicodeError:
+            skipped += 1
+            position += 1
+    return ''.join(parts), skipped
+
+class StreamBuffer:
+    """Fixed-size buffer for live type-through text from the data channel"""
+
+    def __init__(self, size):
+        self.buffer = bytearray(size)
+        self.length = 0
+        self.active = False
+        self.ending = False
+        # Set while the buffered bytes cannot be typed until more arrive
+        self.waiting = False
+        # Free space last announced to the host
+        self.credited = 0
+        self.dropped = 0
+
+    def free(self):
+        return len(self.buffer) - self.length
+
+    def announce(self):
+        """Record and return the free space for a response frame"""
+        self.credited = self.free()
+        return self.credited
+
+    def has_work(self):
+        """Check whether service_stream() can make progress"""
+        return self.active and (self.ending or (self.length > 0 and not self.waiting))
+
+    def begin(self):
+        if self.active:
+            raise ValueError("Stream already active")
+        self.active = True
+        self.ending = False
+        self.waiting = False
+        self.length = 0
+        print("[STREAM] Started")
+        return self.announce()
+
+    def append(self, data):
+        if not self.active or self.ending:
+            raise ValueError("No active stream")
+        if len(data) > self.free():
+            raise ValueError("Stream data exceeds credit")
+        self.buffer[self.length:self.length + len(data)] = data
+        self.length += len(data)
+        self.waiting = False
+        return self.announce()
+
+    def end(self):
+        if not self.active:
+            raise ValueError("No active stream")
+        self.ending = True
+        return self.announce()
+
+    def take(self):
+        """Remove and return the text that can be typed now.
+
+        A trailing partial UTF-8 character or unterminated {command} is kept
+        for the next chunk, unless the stream is ending or the buffer is full;
+        until more data arrives, `waiting` is set. Bytes that are not valid
+        UTF-8 are dropped and counted in `dropped`.
+        """
+        data = bytes(self.buffer[:self.length])
+        end = self.length
+        if not self.ending and end < len(self.buffer):
+            # Back up over UTF-8 continuation bytes of a partial character
+            lead = end
+            while lead > 0 and data[lead - 1] & 0xC0 == 0x80:
+                lead -= 1
+            if lead > 0 and data[lead - 1] >= 0xC0:
+                first = data[lead - 1]
+                needed = 4 if first >= 0xF0 else 3 if first >= 0xE0 else 2
+                if end - (lead - 1) < needed:
+                    end = lead - 1
+            brace = data.rfind(b'{', 0, end)
+            if brace >= 0 and data.find(b'}', brace, end) < 0:
+                end = brace
+        try:
+            text = data[:end].decode('utf-8')
+        except UnicodeError:
+            text, invalid = decode_utf8_lossy(data[:end])
+            self.dropped += invalid
+            print(f"[WARNING] Stream: dropped {invalid} bytes of invalid UTF-8")
+        self.buffer[:self.length - end] = self.buffer[end:self.length]
+        self.length -= end
+        self.waiting = end == 0
+        return text
+
+stream_buffer = StreamBuffer(STREAM_BUFFER_SIZE)
+
+class SlotTableStore:
+    """slot_protocol store backed by slot_table, the slot log and the slot files"""
+
+    def slot_bytes(self, slot):
+        text = load_slot_text(slot)
+        return None if text is None else text.encode('utf-8')
+
+    def store_slot(self, slot, data):
+        if not 1 <= slot <= SLOT_COUNT:
+            raise ValueError(f"Slot out of range: {slot}")
+        write_slot(slot, normalize_text(data.decode('utf-8')))
+        compiled_slots.pop(slot, None)
+        print(f"[LINK] Slot {slot} updated ({len(data)} bytes)")
+
+    def delete_slot(self, slot):
+        if load_slot_text(slot) is None:
+            return False
+        write_slot(slot, None)
+        compiled_slots.pop(slot, None)
+        print(f"[LINK] Slot {slot} deleted")
+        return True
+
+    def slot_numbers(self):
+        return range(1, SLOT_COUNT + 1)
+
+    def apply_config(self, settings):
+        apply_config_changes(settings)
+
+    def stream_begin(self):
+        return stream_buffer.begin()
+
+    def stream_data(self, data):
+        return stream_buffer.append(data)
+
+    def stream_end(self):
+        return stream_buffer.end()
+
+if usb_cdc and usb_cdc.data:
+    data_channel = usb_cdc.data
+    data_channel.timeout = 0
+    slot_server = slot_protocol.SlotServer(SlotTableStore(), MAX_SLOT_UPLOAD)
+    print("[INIT] Slot data channel enabled")
+else:
+    data_channel = None
+    slot_server = None
+
+def service_data_channel():
+    """Handle pending data channel requests; returns True if any bytes were processed"""
+    if data_channel is None or not data_channel.in_waiting:
+        return False
+    responses = slot_server.feed(data_channel.read(data_channel.in_waiting))
+    if responses:
+        data_channel.write(responses)
+    return True
+
 def update_leds(slot):
     """Update LED display for current slot"""
     for i, led in enumerate(leds, start=1):
@@ -233,26 +1042,6 @@ def button_pressed(button, last_state, name=""):
         debug_print('button_pressed')
     return pressed, current_state
 
-def send_character(char):
-    """Send character with keyboard type support"""
-    japanese_keyboard = config.get('japanese_keyboard', True)
-    
-    print(f"[DEBUG] send_character called for: {char}")
-    print(f"[DEBUG] japanese_keyboard: {japanese_keyboard}")
-    
-    if japanese_keyboard and char in JIS_KEYCODE_MAP:
-        # JIS symbol on Japanese keyboard
-        keycodes = JIS_KEYCODE_MAP[char]
-        debug_print('using_jis', char)
-        print(f"[DEBUG] Keycodes: {keycodes}")
-        keyboard.send(*keycodes)
-    else:
-        debug_print('using_layout', char)
-        if char == ':':
-            print("[DEBUG] COLON not found in JIS_KEYCODE_MAP!")
-            print(f"[DEBUG] Available keys: {list(JIS_KEYCODE_MAP.keys())}")
-        layout.write(char)
-
 def convert_text_symbols(text):
     """Symbol conversion for English keyboard (currently direct output)"""
     return text
@@ -313,163 +1102,1311 @@ def convert_for_japanese_keyboard_smart(text):
     
     return result
 
-def get_keycode_from_command(command):
+def get_keycode_from_command(command, key_overrides=None):
     """Get Keycode from command (external settings support)"""
     command_lower = command.lower()
     
+    # Profile overrides take precedence over the shared map
+    if key_overrides and command_lower in key_overrides:
+        return key_overrides[command_lower]
     # Check function key mapping from external settings
     return FUNCTION_KEYCODE_MAP.get(command_lower)
 
-def process_function_keys(text):
-    """Process function keys and break into tokens"""
-    commands = find_brace_commands(text)
-    tokens = []
+def parse_count_command(command, prefix):
+    """Return N for a '<prefix>N' command, or None if it is not one"""
+    if not command.startswith(prefix):
+        return None
+    try:
+        count = int(command[len(prefix):])
+    except ValueError:
+        return None
+    return count if count >= 0 else None
+
+def emit_text(code, text):
+    """Append literal text as OP_TEXT runs"""
+    data = text.encode('ascii')
+    for start in range(0, len(data), MAX_U16):
+        chunk = data[start:start + MAX_U16]
+        code.append(OP_TEXT)
+        code.append(len(chunk) & 0xFF)
+        code.append(len(chunk) >> 8)
+        code.extend(chunk)
+
+def parse_signed_values(command, prefix, count):
+    """Return the signed integers of a '<prefix>A_B...' command, or None"""
+    if not command.startswith(prefix):
+        return None
+    parts = command[len(prefix):].split('_')
+    if len(parts) != count:
+        return None
+    try:
+        return [int(part) for part in parts]
+    except ValueError:
+        return None
+
+def to_signed_byte(value):
+    """Convert an unsigned byte back to a signed value"""
+    return value - 256 if value > 127 else value
+
+def emit_mouse_path(code, x, y, wheel=0):
+    """Precompute a mouse movement into evenly spread report-sized steps"""
+    steps = max(abs(x), abs(y), abs(wheel))
+    steps = (steps + MAX_MOUSE_STEP - 1) // MAX_MOUSE_STEP
+    done = 0
+    while done < steps:
+        batch = min(steps - done, 255)
+        code.append(OP_MOUSE_MOVE)
+        code.append(batch)
+        for step in range(done + 1, done + batch + 1):
+            previous = step - 1
+            for total in (x, y, wheel):
+                code.append((total * step // steps - total * previous // steps) & 0xFF)
+        done += batch
+
+def require_device(device, command):
+    """Reject a command whose HID device is not available"""
+    if device is None:
+        raise ValueError(f"No HID device available for {{{command}}}")
+
+def emit_u16(code, opcode, value):
+    """Append an opcode with a 16-bit little-endian operand"""
+    code.append(opcode)
+    code.append(value & 0xFF)
+    code.append(value >> 8)
+
+def resolve_chord(command, char_table, key_overrides=None):
+    """Resolve a chord such as 'ctrl+shift+t' into (modifier bits, keycodes).
+
+    Raises ValueError for unknown parts so no partial chord is ever sent.
+    """
+    if command.endswith('++'):
+        parts = command[:-2].split('+') + ['+']
+    else:
+        parts = command.split('+')
+
+    modifiers = 0
+    keycodes = bytearray()
+    for part in parts:
+        keycode = get_keycode_from_command(part, key_overrides)
+        if keycode:
+            bit = Keycode.modifier_bit(keycode)
+            if bit:
+                modifiers |= bit
+            else:
+                keycodes.append(keycode)
+        elif len(part) == 1 and ord(part) < 128 and char_table[ord(part) * 2 + 1]:
+            modifiers |= char_table[ord(part) * 2]
+            keycodes.append(char_table[ord(part) * 2 + 1])
+        else:
+            raise ValueError(f"Unknown key '{part}' in chord {{{command}}}")
+
+    if len(keycodes) > 6:
+        raise ValueError(f"Too many keys in chord {{{command}}}")
+    return modifiers, keycodes
+
+def compile_macro(text, enable_commands=True, add_final_enter=False, char_table=None,
+                  key_overrides=None, include=None):
+    """Compile text and {command} tokens into macro bytecode.
+
+    {profile:name} switches the character table and key overrides for the
+    rest of the text. {include:N} splices in the bytecode returned by
+    include(N). Raises ValueError for malformed chord commands and for mouse or media
+    commands when that HID device is not available.
+    """
+    if char_table is None:
+        char_table = US_CHAR_TABLE
+    if not add_final_enter:
+        text = text.replace('\n', '')
+    code = bytearray()
+    if not enable_commands:
+        emit_text(code, text)
+        return code
+
+    repeat_starts = []
     last_end = 0
-    
-    for start, end, command in commands:
+    for start, end, command in find_brace_commands(text):
         # Normal text before command
         if start > last_end:
-            tokens.append(('text', text[last_end:start]))
-        
+            emit_text(code, text[last_end:start])
+        last_end = end
+
         command_lower = command.lower()
-        
-        # Process delay_n format
-        if command_lower.startswith('delay_'):
-            delay_part = command_lower[6:]
-            try:
-                delay_ms = int(delay_part)
-                if delay_ms >= 0:
-                    tokens.append(('delay', delay_ms))
-                else:
-                    tokens.append(('text', '{' + command + '}'))
-            except ValueError:
-                tokens.append(('text', '{' + command + '}'))
-        # Modifier key processing
-        elif command_lower.endswith('_down'):
-            base_key = command_lower.replace('_down', '')
-            keycode = get_keycode_from_command(base_key)
-            if keycode:
-                tokens.append(('modifier_down', keycode))
-                print(f"[DEBUG] Modifier key press recognized: {command}")
-            else:
-                tokens.append(('text', '{' + command + '}'))
-                print(f"[DEBUG] Invalid modifier key->text: {{{command}}}")
-        elif command_lower.endswith('_up'):
-            base_key = command_lower.replace('_up', '')
-            keycode = get_keycode_from_command(base_key)
-            if keycode:
-                tokens.append(('modifier_up', keycode))
-                print(f"[DEBUG] Modifier key release recognized: {command}")
+        delay_ms = parse_count_command(command_lower, 'delay_')
+        repeat_count = parse_count_command(command_lower, 'repeat_')
+
+        if delay_ms is not None:
+            while delay_ms > 0:
+                emit_u16(code, OP_DELAY, min(delay_ms, MAX_U16))
+                delay_ms -= MAX_U16
+        elif repeat_count is not None and repeat_count <= MAX_U16:
+            if len(repeat_starts) >= MAX_REPEAT_DEPTH:
+                raise ValueError(f"Repeats nested too deeply in {{{command}}}")
+            repeat_starts.append(len(code))
+            emit_u16(code, OP_REPEAT, repeat_count)
+        elif command_lower == 'end_repeat' and repeat_starts:
+            repeat_start = repeat_starts.pop()
+            if code[repeat_start + 1] == 0 and code[repeat_start + 2] == 0:
+                # Zero repeats: drop the body entirely
+                code[repeat_start:] = b''
             else:
-                tokens.append(('text', '{' + command + '}'))
-                print(f"[DEBUG] Invalid modifier key->text: {{{command}}}")
-        # Single key processing
+                code.append(OP_END_REPEAT)
+        elif parse_signed_values(command_lower, 'mouse_move_', 2) is not None:
+            require_device(mouse, command)
+            x, y = parse_signed_values(command_lower, 'mouse_move_', 2)
+            emit_mouse_path(code, x, y)
+        elif parse_signed_values(command_lower, 'scroll_', 1) is not None:
+            require_device(mouse, command)
+            emit_mouse_path(code, 0, 0, parse_signed_values(command_lower, 'scroll_', 1)[0])
+        elif command_lower in MOUSE_BUTTON_MAP:
+            require_device(mouse, command)
+            code.append(OP_MOUSE_CLICK)
+            code.append(MOUSE_BUTTON_MAP[command_lower])
+        elif command_lower.endswith('_down') and command_lower[:-5] in MOUSE_BUTTON_MAP:
+            require_device(mouse, command)
+            code.append(OP_MOUSE_DOWN)
+            code.append(MOUSE_BUTTON_MAP[command_lower[:-5]])
+        elif command_lower.endswith('_up') and command_lower[:-3] in MOUSE_BUTTON_MAP:
+            require_device(mouse, command)
+            code.append(OP_MOUSE_UP)
+            code.append(MOUSE_BUTTON_MAP[command_lower[:-3]])
+        elif command_lower in CONSUMER_CODE_MAP:
+            require_device(consumer_control, command)
+            emit_u16(code, OP_CONSUMER, CONSUMER_CODE_MAP[command_lower])
+        elif command_lower.startswith('profile:') and command_lower[8:] in KEYBOARD_PROFILES:
+            keyboard_profile = KEYBOARD_PROFILES[command_lower[8:]]
+            code.append(OP_PROFILE)
+            code.append(keyboard_profile.index)
+            char_table = keyboard_profile.char_table
+            key_overrides = keyboard_profile.key_overrides
+        elif include and parse_count_command(command_lower, 'include:') is not None:
+            fragment = include(parse_count_command(command_lower, 'include:'))
+            if len(repeat_starts) + repeat_depth(fragment) > MAX_REPEAT_DEPTH:
+                raise ValueError(f"Repeats nested too deeply in {{{command}}}")
+            code.extend(fragment)
+        elif '+' in command_lower and len(command_lower) > 1:
+            modifiers, keycodes = resolve_chord(command_lower, char_table, key_overrides)
+            code.append(OP_CHORD)
+            code.append(modifiers)
+            code.append(len(keycodes))
+            code.extend(keycodes)
+        elif command_lower.endswith('_down') and get_keycode_from_command(command_lower[:-5], key_overrides):
+            code.append(OP_DOWN)
+            code.append(get_keycode_from_command(command_lower[:-5], key_overrides))
+        elif command_lower.endswith('_up') and get_keycode_from_command(command_lower[:-3], key_overrides):
+            code.append(OP_UP)
+            code.append(get_keycode_from_command(command_lower[:-3], key_overrides))
+        elif get_keycode_from_command(command_lower, key_overrides):
+            code.append(OP_KEY)
+            code.append(get_keycode_from_command(command_lower, key_overrides))
         else:
-            keycode = get_keycode_from_command(command)
-            if keycode:
-                tokens.append(('single_key', keycode))
-                print(f"[DEBUG] Single key recognized: {command}")
-            else:
-                tokens.append(('text', '{' + command + '}'))
-                print(f"[DEBUG] Invalid command->text: {{{command}}}")
-        
-        last_end = end
-    
+            emit_text(code, '{' + command + '}')
+            print(f"[DEBUG] Invalid command->text: {{{command}}}")
+
     # Remaining text
     if last_end < len(text):
-        tokens.append(('text', text[last_end:]))
-    
-    return tokens
+        emit_text(code, text[last_end:])
 
-def send_tokens(tokens, typing_delay, add_final_enter=False):
-    """Send tokens in sequence"""
-    
-    for token_type, content in tokens:
-        try:
-            if token_type == 'text':
-                for char in content:
-                    if char == '\n':
-                        if add_final_enter:
-                            keyboard.send(Keycode.ENTER)
-                            print(f"[DEBUG] Newline sent")
-                        else:
-                            continue  # Ignore newline character
+    while repeat_starts:
+        print("[WARNING] Missing {end_repeat}, closing repeat at end of text")
+        repeat_start = repeat_starts.pop()
+        if code[repeat_start + 1] == 0 and code[repeat_start + 2] == 0:
+            code[repeat_start:] = b''
+        else:
+            code.append(OP_END_REPEAT)
+
+    return code
+
+class FlowControl:
+    """Host-acknowledged pacing using a lock key LED round trip.
+
+    Every `chunk` keystrokes the lock key is toggled and the host's LED
+    output report is awaited, which only arrives once the host has consumed
+    everything typed before it. The measured round trip adapts both the
+    chunk size and the per-keystroke delay.
+    """
+
+    def __init__(self, lock_key, chunk, timeout, target_rtt, max_delay):
+        self.lock_keycode, self.led_bit = FLOW_CONTROL_KEYS[lock_key]
+        self.chunk = max(FLOW_CONTROL_MIN_CHUNK, min(chunk, FLOW_CONTROL_MAX_CHUNK))
+        self.timeout_ns = int(timeout * 1000000000)
+        self.target_rtt_ns = int(target_rtt * 1000000000)
+        self.max_delay = max_delay
+        self.active = True
+        self.syncs = 0
+        self.max_rtt_ns = 0
+
+    def _toggle_and_wait(self):
+        """Toggle the lock key and return the LED round trip in ns, or None on timeout"""
+        expected = not keyboard.led_on(self.led_bit)
+        start_ns = time.monotonic_ns()
+        keyboard.press(self.lock_keycode)
+        keyboard.release(self.lock_keycode)
+        while keyboard.led_on(self.led_bit) != expected:
+            if time.monotonic_ns() - start_ns > self.timeout_ns:
+                return None
+            time.sleep(0.0005)
+        return time.monotonic_ns() - start_ns
+
+    def sync(self, delay):
+        """Wait for the host to catch up and return the adapted keystroke delay"""
+        if keyboard.report_modifier[0] or keyboard.report_keys[0]:
+            # Never combine the lock key with held keys (e.g. Ctrl+Scroll Lock is Break)
+            return delay
+
+        rtt_ns = self._toggle_and_wait()
+        # Restore the original lock state even if the first echo never came
+        restore_ns = self._toggle_and_wait()
+        if rtt_ns is None or restore_ns is None:
+            print("[WARNING] No LED echo from host, flow control disabled for this send")
+            self.active = False
+            return self.max_delay
+
+        rtt_ns = (rtt_ns + restore_ns) // 2
+        self.syncs += 1
+        self.max_rtt_ns = max(self.max_rtt_ns, rtt_ns)
+        if rtt_ns < self.target_rtt_ns // 2:
+            # Host keeps up: type faster and check less often
+            self.chunk = min(self.chunk * 2, FLOW_CONTROL_MAX_CHUNK)
+            delay = delay / 2 if delay > 0.0005 else 0
+        elif rtt_ns > self.target_rtt_ns:
+            # Host is lagging: back off
+            self.chunk = max(self.chunk // 2, FLOW_CONTROL_MIN_CHUNK)
+            delay = min(max(delay * 2, 0.001), self.max_delay)
+        return delay
+
+def create_flow_control(settings):
+    """Create a FlowControl from settings, or None when disabled"""
+    if not settings.get('flow_control', False):
+        return None
+    lock_key = settings['flow_control_key']
+    if lock_key not in FLOW_CONTROL_KEYS:
+        print(f"[WARNING] Unsupported flow_control_key: {lock_key}")
+        return None
+    return FlowControl(lock_key, settings['flow_control_chunk'],
+                       config['flow_control_timeout'],
+                       config['flow_control_target_rtt'], settings['typing_delay'])
+
+def transition_delays_ns(settings):
+    """Return the (plain, modifier, repeat, enter, command) delays in ns.
+
+    Each class is its 'transition_delays' factor (default 1) times the
+    settings' typing_delay; the risky classes never wait less than a plain
+    keystroke.
+    """
+    table = settings['transition_delays']
+    typing_delay_ns = settings['typing_delay'] * 1000000000
+    plain_ns = int(table.get('plain', 1) * typing_delay_ns)
+    return (plain_ns,) + tuple(max(plain_ns, int(table.get(name, 1) * typing_delay_ns))
+                               for name in TRANSITION_CLASSES[1:])
+
+def estimate_macro_cost(code, char_table, settings, flow=None):
+    """Predict (report count, character count, duration in ns) of a compiled macro
+    sent with the given settings, without sending it"""
+    delay_ns, modifier_ns, repeat_ns, enter_ns, command_ns = transition_delays_ns(settings)
+    mouse_interval_ns = int(config['mouse_report_interval'] * 1000000000)
+    last_keycode = 0
+    last_modifier = 0
+    reports = 0
+    keystrokes = 0
+    characters = 0
+    wait_ns = 0
+    multiplier = 1
+    repeat_counts = []
+    pc = 0
+    code_end = len(code)
+
+    while pc < code_end:
+        op = code[pc]
+        if op == OP_TEXT:
+            next_pc = pc + 3 + (code[pc + 1] | (code[pc + 2] << 8))
+            typed = 0
+            transition_ns = 0
+            for index in range(pc + 3, next_pc):
+                entry = code[index] << 1
+                keycode = char_table[entry + 1]
+                if keycode:
+                    typed += 1
+                    modifier = char_table[entry]
+                    if keycode == Keycode.ENTER:
+                        transition_ns += enter_ns - delay_ns
+                    elif keycode == last_keycode:
+                        transition_ns += repeat_ns - delay_ns
+                    elif modifier != last_modifier:
+                        transition_ns += modifier_ns - delay_ns
+                    last_keycode = keycode
+                    last_modifier = modifier
+            keystrokes += typed * multiplier
+            characters += typed * multiplier
+            wait_ns += transition_ns * multiplier
+        elif op == OP_CHORD:
+            next_pc = pc + 3 + code[pc + 2]
+            keystrokes += multiplier
+            wait_ns += (command_ns - delay_ns) * multiplier
+        elif op == OP_MOUSE_MOVE:
+            next_pc = pc + 2 + code[pc + 1] * 3
+            reports += code[pc + 1] * multiplier
+            wait_ns += code[pc + 1] * multiplier * mouse_interval_ns
+        elif op == OP_DELAY:
+            next_pc = pc + 3
+            wait_ns += (code[pc + 1] | (code[pc + 2] << 8)) * 1000000 * multiplier
+        elif op == OP_REPEAT:
+            next_pc = pc + 3
+            repeat_counts.append(code[pc + 1] | (code[pc + 2] << 8))
+            multiplier *= repeat_counts[-1]
+        elif op == OP_END_REPEAT:
+            next_pc = pc + 1
+            multiplier //= repeat_counts.pop()
+        elif op == OP_CONSUMER:
+            next_pc = pc + 3
+            keystrokes += multiplier
+            wait_ns += (command_ns - delay_ns) * multiplier
+        elif op == OP_PROFILE:
+            next_pc = pc + 2
+            char_table = PROFILE_CHAR_TABLES[code[pc + 1]]
+        else:
+            next_pc = pc + 2
+            if op == OP_KEY or op == OP_MOUSE_CLICK:
+                keystrokes += multiplier
+                wait_ns += (command_ns - delay_ns) * multiplier
+            else:
+                reports += multiplier
+        pc = next_pc
+
+    # Each keystroke is a press and a release report followed by the typing delay
+    reports += keystrokes * 2
+    total_ns = reports * ESTIMATED_REPORT_NS + keystrokes * delay_ns + wait_ns
+    if flow:
+        # Each sync is two lock key round trips of four reports
+        syncs = keystrokes // flow.chunk
+        reports += syncs * 4
+        total_ns += syncs * (4 * ESTIMATED_REPORT_NS + 2 * flow.target_rtt_ns)
+    return reports, characters, total_ns
+
+def show_progress(start_ns, now_ns, total_ns):
+    """Light a progress bar on the slot LEDs and return the next refresh time"""
+    lit = 1 + (now_ns - start_ns) * (len(leds) - 1) // total_ns
+    for i, led in enumerate(leds):
+        led.value = i < lit
+    return now_ns + PROGRESS_INTERVAL_NS
+
+def show_estimate(total_ns):
+    """Show an estimated send duration on the slot LEDs (1 LED: <1 s ... 5: >=2 min)"""
+    lit = 1
+    for seconds in ESTIMATE_DISPLAY_SECONDS:
+        if total_ns >= seconds * 1000000000:
+            lit += 1
+    for i, led in enumerate(leds):
+        led.value = i < lit
+
+def wait_until(deadline_ns):
+    """Sleep until the given time.monotonic_ns() deadline"""
+    remaining_ns = deadline_ns - time.monotonic_ns()
+    if remaining_ns > 0:
+        time.sleep(remaining_ns / 1000000000)
+
+class SendPaused(Exception):
+    """Raised inside run_macro to stop a send at its checkpoint"""
+
+class SendCheckpoint:
+    """Resume position of an interrupted send.
+
+    The position (bytecode pc, offset inside a text or mouse path operation
+    and the open repeat counters) is updated in RAM at the progress refresh
+    cadence and, when a send pauses, set to the first keystroke the host did
+    not receive. With an nvm backing it is also written every
+    checkpoint_interval seconds and when a send pauses, so it survives a
+    replug; nvm writes erase a flash sector, hence the interval.
+    """
+
+    def __init__(self, nvm, interval):
+        self.nvm = nvm
+        self.interval_ns = int(interval * 1000000000)
+        self.size = struct.calcsize(CHECKPOINT_FORMAT)
+        self.slot = 0
+        self.code_length = 0
+        self.code_check = 0
+        self.pc = 0
+        self.index = 0
+        self.loops = ()
+        self.paused = False
+        self.saved_ns = 0
+        self.stored = False
+        if nvm is None:
+            return
+        stored = struct.unpack(CHECKPOINT_FORMAT,
+                               nvm[CHECKPOINT_NVM_OFFSET:CHECKPOINT_NVM_OFFSET + self.size])
+        if stored[0] == CHECKPOINT_MAGIC and stored[1]:
+            self.slot, self.code_length, self.code_check, self.pc, self.index = stored[1:6]
+            loop_values = stored[7:7 + 2 * stored[6]]
+            self.loops = tuple((loop_values[i], loop_values[i + 1])
+                               for i in range(0, len(loop_values), 2))
+            self.paused = True
+            self.stored = True
+            print(f"[CHECKPOINT] Interrupted send of slot {self.slot} found; "
+                  "long-press Send to resume")
+
+    def start(self, slot, code):
+        """Begin tracking a send from the start of code"""
+        self.slot = slot
+        self.code_length = len(code)
+        self.code_check = sum(code) & 0xFFFFFFFF
+        self.pc = 0
+        self.index = 0
+        self.loops = ()
+        self.paused = False
+        self.saved_ns = time.monotonic_ns()
+
+    def can_resume(self, slot, code):
+        """Check that a paused send of this slot's current code can continue"""
+        return (self.paused and self.slot == slot and self.code_length == len(code)
+                and self.code_check == sum(code) & 0xFFFFFFFF)
+
+    def update(self, pc, index, loop_stack):
+        """Record the next position to send"""
+        self.pc = pc
+        self.index = index
+        self.loops = tuple((loop[0], loop[1]) for loop in loop_stack)
+        if self.nvm is not None and time.monotonic_ns() - self.saved_ns >= self.interval_ns:
+            self.save()
+
+    def pause(self, reason):
+        """Mark the send as interrupted at the recorded position"""
+        self.paused = True
+        self.save()
+        print(f"[CHECKPOINT] Send of slot {self.slot} paused at {self.pc}: {reason}")
+
+    def clear(self):
+        """Forget the checkpoint after a completed send"""
+        self.slot = 0
+        self.paused = False
+        if self.stored:
+            self.save()
+
+    def save(self):
+        """Write the checkpoint to nvm when it changed"""
+        if self.nvm is None:
+            return
+        self.saved_ns = time.monotonic_ns()
+        self.stored = self.slot != 0
+        loop_values = []
+        for loop in self.loops:
+            loop_values.extend(loop)
+        loop_values.extend([0] * (2 * MAX_REPEAT_DEPTH - len(loop_values)))
+        packed = struct.pack(CHECKPOINT_FORMAT, CHECKPOINT_MAGIC, self.slot,
+                             self.code_length, self.code_check, self.pc, self.index,
+                             len(self.loops), *loop_values)
+        end = CHECKPOINT_NVM_OFFSET + self.size
+        if self.nvm[CHECKPOINT_NVM_OFFSET:end] != packed:
+            self.nvm[CHECKPOINT_NVM_OFFSET:end] = packed
+
+send_checkpoint = SendCheckpoint(
+    microcontroller.nvm if microcontroller and config['checkpoint_nvm'] else None,
+    config['checkpoint_interval'])
+
+def op_end(code, pc):
+    """Return the offset of the operation following the one at pc"""
+    op = code[pc]
+    if op == OP_TEXT:
+        return pc + 3 + (code[pc + 1] | (code[pc + 2] << 8))
+    if op == OP_CHORD:
+        return pc + 3 + code[pc + 2]
+    if op == OP_MOUSE_MOVE:
+        return pc + 2 + code[pc + 1] * 3
+    if op == OP_DELAY or op == OP_REPEAT or op == OP_CONSUMER:
+        return pc + 3
+    if op == OP_END_REPEAT:
+        return pc + 1
+    return pc + 2
+
+def repeat_depth(code):
+    """Return the deepest {repeat_N} nesting in compiled code"""
+    depth = 0
+    deepest = 0
+    pc = 0
+    while pc < len(code):
+        if code[pc] == OP_REPEAT:
+            depth += 1
+            deepest = max(deepest, depth)
+        elif code[pc] == OP_END_REPEAT:
+            depth -= 1
+        pc = op_end(code, pc)
+    return deepest
+
+def char_table_at(code, pc, char_table):
+    """Return the character table in effect at pc, after any {profile:...} switches"""
+    position = 0
+    while position < pc:
+        if code[position] == OP_PROFILE:
+            char_table = PROFILE_CHAR_TABLES[code[position + 1]]
+        position = op_end(code, position)
+    return char_table
+
+def usb_connected():
+    """Return False once the USB host has gone away"""
+    return supervisor is None or supervisor.runtime.usb_connected
+
+def run_macro(code, char_table, settings, flow=None, estimated_ns=0, checkpoint=None):
+    """Execute compiled macro bytecode, optionally paced by host flow control.
+
+    Keyboard, mouse and consumer reports share one schedule: every action
+    waits for `ready_ns`, then pushes it forward by its own cost (its
+    'transition_delays' class, the mouse report interval or an explicit
+    {delay_N}). Plain keystrokes wait the 'plain' delay, which flow control
+    adapts; risky transitions (Enter, a repeated key, a modifier change, a
+    {command} key) wait their own class delay, so plain runs take the fast
+    path with a single comparison chain. When
+    `estimated_ns` is given, the LEDs show progress against it; the check
+    reuses the schedule timestamp, so it costs one comparison per keystroke.
+
+    After every keystroke, the keyboard's retry queue and drop counter are
+    compared (two int compares) to track the first keystroke that has not
+    been delivered. With a checkpoint, the position is recorded at the
+    progress cadence while everything was delivered. The send pauses as
+    soon as the keyboard drops a report after its retries, or when USB
+    disconnects (checked at the progress cadence), and then resumes at the
+    first undelivered keystroke, or the one after the last sent if all were
+    delivered; a paused checkpoint passed in again resumes from its position.
+    Returns the number of operations that failed.
+    """
+    report_modifier = keyboard.report_modifier
+    press = keyboard.press
+    release = keyboard.release
+    monotonic_ns = time.monotonic_ns
+    loop_stack = []
+    pc = 0
+    resume_index = 0
+    if checkpoint and checkpoint.paused:
+        pc = checkpoint.pc
+        resume_index = checkpoint.index
+        loop_stack = [list(loop) for loop in checkpoint.loops]
+        char_table = char_table_at(code, pc, char_table)
+        checkpoint.paused = False
+        print(f"[CHECKPOINT] Resuming slot {checkpoint.slot} at {pc}")
+    index = resume_index
+    code_end = len(code)
+    delay_ns, modifier_ns, repeat_ns, enter_ns, command_ns = transition_delays_ns(settings)
+    delay = delay_ns / 1000000000
+    enter_keycode = Keycode.ENTER
+    last_keycode = 0
+    last_modifier = 0
+    mouse_interval_ns = int(config['mouse_report_interval'] * 1000000000)
+    ready_ns = monotonic_ns()
+    start_ns = ready_ns
+    if config['profiling']:
+        # Only pay for per-report timing while profiling
+        press = profile_reports(press, start_ns)
+    progress_ns = start_ns if estimated_ns or checkpoint else NO_PROGRESS_NS
+    pacer = flow
+    sync_countdown = flow.chunk if flow else 0
+    errors = 0
+    retries = keyboard.retries
+    dropped = keyboard.dropped
+    # (pc, index, loops) of the first keystroke whose reports may not have
+    # reached the host; checked after every report, so a pause resumes there
+    undelivered = None
+    # Set once a mouse button was pressed, so only macros that can leave
+    # one held send the final mouse release report
+    mouse_pressed = False
+
+    try:
+        while pc < code_end:
+            op = code[pc]
+            # Decode the operation length first so a failing op can be skipped
+            if op == OP_TEXT:
+                next_pc = pc + 3 + (code[pc + 1] | (code[pc + 2] << 8))
+            elif op == OP_CHORD:
+                next_pc = pc + 3 + code[pc + 2]
+            elif op == OP_MOUSE_MOVE:
+                next_pc = pc + 2 + code[pc + 1] * 3
+            elif op == OP_DELAY or op == OP_REPEAT or op == OP_CONSUMER:
+                next_pc = pc + 3
+            elif op == OP_END_REPEAT:
+                next_pc = pc + 1
+            else:
+                next_pc = pc + 2
+
+            try:
+                if op == OP_TEXT:
+                    index = pc + 3
+                    if resume_index:
+                        index = resume_index
+                        resume_index = 0
+                    while index < next_pc:
+                        entry = code[index] << 1
+                        keycode = char_table[entry + 1]
+                        if keycode:
+                            wait_until(ready_ns)
+                            modifier = char_table[entry]
+                            held = report_modifier[0]
+                            report_modifier[0] = held | modifier
+                            press(keycode)
+                            report_modifier[0] = held
+                            release(keycode)
+                            if keycode == enter_keycode:
+                                ready_ns = monotonic_ns() + max(delay_ns, enter_ns)
+                            elif keycode == last_keycode:
+                                ready_ns = monotonic_ns() + max(delay_ns, repeat_ns)
+                            elif modifier != last_modifier:
+                                ready_ns = monotonic_ns() + max(delay_ns, modifier_ns)
+                            else:
+                                ready_ns = monotonic_ns() + delay_ns
+                            last_keycode = keycode
+                            last_modifier = modifier
+                            if keyboard.pending or keyboard.dropped != dropped:
+                                if undelivered is None:
+                                    undelivered = (pc, index, [list(loop) for loop in loop_stack])
+                                if checkpoint and keyboard.dropped != dropped:
+                                    raise SendPaused("HID reports dropped")
+                            elif undelivered:
+                                undelivered = None
+                            if ready_ns > progress_ns:
+                                progress_ns = ready_ns + PROGRESS_INTERVAL_NS
+                                if estimated_ns:
+                                    show_progress(start_ns, ready_ns, estimated_ns)
+                                if checkpoint:
+                                    if not undelivered:
+                                        checkpoint.update(pc, index + 1, loop_stack)
+                                    if not usb_connected():
+                                        raise SendPaused("USB disconnected")
+                            if pacer:
+                                sync_countdown -= 1
+                                if sync_countdown <= 0:
+                                    delay = pacer.sync(delay)
+                                    delay_ns = int(delay * 1000000000)
+                                    sync_countdown = pacer.chunk
+                                    if not pacer.active:
+                                        pacer = None
+                        index += 1
+
+                elif op == OP_KEY:
+                    wait_until(ready_ns)
+                    press(code[pc + 1])
+                    release(code[pc + 1])
+                    ready_ns = monotonic_ns() + max(delay_ns, command_ns)
+                    sync_countdown -= 1
+
+                elif op == OP_CHORD:
+                    keycodes = code[pc + 3:next_pc]
+                    wait_until(ready_ns)
+                    held = report_modifier[0]
+                    report_modifier[0] = held | code[pc + 1]
+                    press(*keycodes)
+                    report_modifier[0] = held
+                    release(*keycodes)
+                    ready_ns = monotonic_ns() + max(delay_ns, command_ns)
+                    sync_countdown -= 1
+
+                elif op == OP_DOWN:
+                    press(code[pc + 1])
+
+                elif op == OP_UP:
+                    release(code[pc + 1])
+
+                elif op == OP_DELAY:
+                    ready_ns = max(ready_ns, monotonic_ns()) + \
+                        (code[pc + 1] | (code[pc + 2] << 8)) * 1000000
+
+                elif op == OP_REPEAT:
+                    loop_stack.append([next_pc, code[pc + 1] | (code[pc + 2] << 8)])
+
+                elif op == OP_END_REPEAT:
+                    loop = loop_stack[-1]
+                    loop[1] -= 1
+                    if loop[1] > 0:
+                        next_pc = loop[0]
                     else:
-                        send_character(char)
-                    time.sleep(typing_delay)
-            
-            elif token_type == 'modifier_down':
-                keyboard.press(content)
-                print(f"[DEBUG] Key press: {content}")
-            
-            elif token_type == 'modifier_up':
-                keyboard.release(content)
-                print(f"[DEBUG] Key release: {content}")
-            
-            elif token_type == 'single_key':
-                keyboard.send(content)
-                print(f"[DEBUG] Single key: {content}")
-                time.sleep(typing_delay)
-            
-            elif token_type == 'delay':
-                delay_seconds = content / 1000.0
-                time.sleep(delay_seconds)
-        
-        except Exception as e:
-            print(f"[ERROR] Token error: {e}")
-            continue
+                        loop_stack.pop()
+
+                elif op == OP_MOUSE_MOVE:
+                    # Precomputed (x, y, wheel) steps, each within one report's range
+                    index = pc + 2
+                    if resume_index:
+                        index = resume_index
+                        resume_index = 0
+                    while index < next_pc:
+                        wait_until(ready_ns)
+                        mouse.move(to_signed_byte(code[index]),
+                                   to_signed_byte(code[index + 1]),
+                                   to_signed_byte(code[index + 2]))
+                        ready_ns = monotonic_ns() + mouse_interval_ns
+                        index += 3
+
+                elif op == OP_MOUSE_CLICK:
+                    wait_until(ready_ns)
+                    mouse_pressed = True
+                    mouse.press(code[pc + 1])
+                    mouse.release(code[pc + 1])
+                    ready_ns = monotonic_ns() + max(delay_ns, command_ns)
+
+                elif op == OP_MOUSE_DOWN:
+                    mouse_pressed = True
+                    mouse.press(code[pc + 1])
+
+                elif op == OP_MOUSE_UP:
+                    mouse.release(code[pc + 1])
+
+                elif op == OP_CONSUMER:
+                    wait_until(ready_ns)
+                    consumer_control.send(code[pc + 1] | (code[pc + 2] << 8))
+                    ready_ns = monotonic_ns() + max(delay_ns, command_ns)
+
+                elif op == OP_PROFILE:
+                    char_table = PROFILE_CHAR_TABLES[code[pc + 1]]
+
+                else:
+                    print(f"[ERROR] Unknown opcode {op} at {pc}")
+                    break
+
+                if keyboard.pending or keyboard.dropped != dropped:
+                    if undelivered is None:
+                        undelivered = (pc, 0, [list(loop) for loop in loop_stack])
+                    if checkpoint and keyboard.dropped != dropped:
+                        raise SendPaused("HID reports dropped")
+                elif undelivered:
+                    undelivered = None
+                if ready_ns > progress_ns:
+                    progress_ns = ready_ns + PROGRESS_INTERVAL_NS
+                    if estimated_ns:
+                        show_progress(start_ns, ready_ns, estimated_ns)
+                    if checkpoint:
+                        if not undelivered:
+                            checkpoint.update(next_pc, 0, loop_stack)
+                        if not usb_connected():
+                            raise SendPaused("USB disconnected")
+                if pacer and sync_countdown <= 0:
+                    delay = pacer.sync(delay)
+                    delay_ns = int(delay * 1000000000)
+                    sync_countdown = pacer.chunk
+                    if not pacer.active:
+                        pacer = None
+
+            except SendPaused:
+                raise
+            except Exception as e:
+                if checkpoint and isinstance(e, OSError):
+                    # The host stopped accepting reports: resume at the failed one
+                    if not undelivered:
+                        resume_at = index if op == OP_TEXT or op == OP_MOUSE_MOVE else 0
+                        checkpoint.update(pc, resume_at, loop_stack)
+                    raise SendPaused(f"HID error: {e}")
+                print(f"[ERROR] Macro error at {pc}: {e}")
+                errors += 1
+
+            pc = next_pc
+
+        # Honor trailing delays before anything else is sent
+        wait_until(ready_ns)
+        if checkpoint:
+            checkpoint.clear()
+    except SendPaused as e:
+        if undelivered:
+            checkpoint.update(*undelivered)
+        checkpoint.pause(e)
+    finally:
+        # Never leave keys or buttons held down after a macro: deliver any
+        # reports still queued for retry, then a final all-released report
+        if not keyboard.flush():
+            print("[WARNING] Final key release report could not be sent")
+        if mouse and mouse_pressed:
+            try:
+                mouse.release_all()
+            except OSError as e:
+                print(f"[WARNING] Final mouse release report could not be sent: {e}")
+        if keyboard.retries != retries or keyboard.dropped != dropped:
+            print(f"[HID] {keyboard.retries - retries} retries, "
+                  f"{keyboard.dropped - dropped} reports dropped")
+        if flow and flow.syncs:
+            print(f"[FLOW] {flow.syncs} syncs, max RTT {flow.max_rtt_ns // 1000} us, "
+                  f"final delay {delay}")
+    return errors
+
+# ASCII equivalents for smart punctuation, special spaces and full-width text
+# pasted from word processors, chat apps and Japanese IMEs
+ASCII_REPLACEMENTS = {
+    '\u2018': "'", '\u2019': "'", '\u201a': "'", '\u201b': "'", '\u2032': "'",
+    '\u201c': '"', '\u201d': '"', '\u201e': '"', '\u201f': '"', '\u2033': '"',
+    '\u2010': '-', '\u2011': '-', '\u2012': '-', '\u2013': '-', '\u2014': '-',
+    '\u2015': '-', '\u2212': '-', '\u2026': '...', '\u2022': '*', '\u00d7': 'x',
+    '\u00a0': ' ', '\u2002': ' ', '\u2003': ' ', '\u2009': ' ', '\u202f': ' ',
+    '\u3000': ' ', '\u3001': ',', '\u3002': '.', '\u00a5': '\\', '\uffe5': '\\',
+    '\u200b': '', '\ufeff': ''
+}
+# Full-width ASCII (U+FF01-U+FF5E) is the ASCII range shifted by 0xFEE0
+for codepoint in range(0xFF01, 0xFF5F):
+    ASCII_REPLACEMENTS[chr(codepoint)] = chr(codepoint - 0xFEE0)
 
 def extract_ascii_chars(text):
-    """Extract ASCII characters and newlines from text"""
-    return ''.join(char for char in text if char == '\n' or ord(char) <= 127)
-
-def send_text_with_speed(text):
-    """Send text at configured speed"""
-    typing_delay = config['typing_delay']
-    enable_modifier_keys = config.get('enable_modifier_keys', False)
-    add_final_enter = config.get('add_final_enter', False)
-    japanese_keyboard = config.get('japanese_keyboard', True)
+    """Transliterate text to ASCII in one pass.
+
+    Returns (ascii text, number of characters with no ASCII equivalent,
+    which are dropped). ASCII characters only pay the ord() check that
+    filtering already needed.
+    """
+    replacements = ASCII_REPLACEMENTS
+    parts = []
+    unmapped = 0
+    for char in text:
+        if ord(char) > 127:
+            char = replacements.get(char)
+            if char is None:
+                unmapped += 1
+                continue
+        parts.append(char)
+    return ''.join(parts), unmapped
+
+def convert_kana(text, settings):
+    """Apply kana_mode to slot text (lib/kana_romaji.py is imported on first use)"""
+    if not settings.get('kana_mode', False):
+        return text
+    try:
+        import kana_romaji
+    except ImportError:
+        print("[WARNING] kana_mode is enabled but lib/kana_romaji.py is missing")
+        return text
+    ime_on = settings.get('ime_on_sequence', '')
+    ime_off = settings.get('ime_off_sequence', '')
+    if (ime_on or ime_off) and not settings.get('enable_modifier_keys', False):
+        print("[WARNING] IME sequences need enable_modifier_keys")
+        ime_on = ime_off = ''
+    return kana_romaji.kana_to_romaji(text, ime_on, ime_off)
+
+def parse_front_matter(text):
+    """Split an optional settings header off slot text.
+
+    The header is a block of 'key: value' lines between two '---' lines at
+    the very top of the slot. Values are JSON (true, 0.05, "num_lock") or
+    bare strings. The block only counts as a header when every line in it
+    (other than blank lines and # comments) sets a slot setting, so a slot
+    that is itself a multi-document YAML file is typed as-is. Returns
+    (overrides, body).
+    """
+    if not text.startswith(FRONT_MATTER_MARKER + '\n'):
+        return {}, text
+    end = text.find('\n' + FRONT_MATTER_MARKER + '\n', len(FRONT_MATTER_MARKER))
+    if end < 0:
+        if not text.endswith('\n' + FRONT_MATTER_MARKER):
+            return {}, text
+        end = len(text) - len(FRONT_MATTER_MARKER) - 1
+    header = text[len(FRONT_MATTER_MARKER) + 1:end]
+    body = text[end + len(FRONT_MATTER_MARKER) + 2:]
+
+    entries = []
+    for line in header.split('\n'):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        parts = line.split(':', 1)
+        if len(parts) != 2 or parts[0].strip() not in SLOT_SETTING_KEYS:
+            # Not a settings header but the slot's own content
+            return {}, text
+        entries.append((parts[0].strip(), parts[1].strip()))
+    if not entries:
+        return {}, text
+
+    overrides = {}
+    for key, value in entries:
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass
+        if not setting_is_valid(key, value):
+            print(f"[WARNING] Invalid value for slot setting {key}: {value}")
+        else:
+            overrides[key] = value
+    return overrides, body
+
+class KeyboardProfile:
+    """A named target layout: send settings, character table and key name overrides.
+
+    Character tables are the shared US/JIS tables and overrides only hold
+    the keys that differ, so resident profiles cost little memory.
+    """
+
+    def __init__(self, name, index, spec):
+        self.name = name
+        self.index = index
+        self.settings = {}
+        for key, value in spec.items():
+            if key in SLOT_SETTING_KEYS and key != 'profile' and setting_is_valid(key, value):
+                self.settings[key] = value
+            elif key != 'keys':
+                print(f"[WARNING] Invalid setting in profile {name}: {key}")
+        japanese = self.settings.get('japanese_keyboard', config['japanese_keyboard'])
+        self.char_table = JIS_CHAR_TABLE if japanese else US_CHAR_TABLE
+        self.key_overrides = {}
+        for command, keycode_name in spec.get('keys', {}).items():
+            keycode = Keycode.from_name(keycode_name)
+            if keycode is not None:
+                self.key_overrides[command.lower()] = keycode
+            else:
+                print(f"[WARNING] Unknown keycode in profile {name}: {keycode_name}")
+
+def load_keyboard_profiles():
+    """Build every configured profile"""
+    # Indices follow the sorted lowercase names, the order of PROFILE_NAMES
+    specs = {name.lower(): spec for name, spec in config['profiles'].items()}
+    profiles = {}
+    for index, name in enumerate(sorted(specs)):
+        profiles[name] = KeyboardProfile(name, index, specs[name])
+    return profiles
+
+def install_keyboard_profiles():
+    """(Re)build the resident profiles from the configuration"""
+    global KEYBOARD_PROFILES, PROFILE_NAMES, PROFILE_CHAR_TABLES
+    KEYBOARD_PROFILES = load_keyboard_profiles()
+    PROFILE_NAMES = sorted(KEYBOARD_PROFILES)
+    # Character tables by profile index, for OP_PROFILE
+    PROFILE_CHAR_TABLES = [KEYBOARD_PROFILES[name].char_table for name in PROFILE_NAMES]
+    if config['profile'] and config['profile'] not in KEYBOARD_PROFILES:
+        print(f"[WARNING] Unknown profile: {config['profile']}")
+        config['profile'] = ''
+
+install_keyboard_profiles()
+
+def set_profile(name):
+    """Switch the active keyboard profile ('' for none) without rebooting"""
+    if name and name not in KEYBOARD_PROFILES:
+        raise ValueError(f"Unknown profile: {name}")
+    config['profile'] = name
+    # Compiled slots embed profile key overrides
+    compiled_slots.clear()
+    compiled_fragments.clear()
+    print(f"[MAIN] Keyboard profile: {name or 'none'}")
+
+def settings_key(value):
+    """Return a hashable form of a setting value"""
+    return tuple(sorted(value.items())) if isinstance(value, dict) else value
+
+def slot_settings(overrides):
+    """Return the send settings for a slot: config values, then its profile, then its overrides"""
+    settings = {key: config[key] for key in SLOT_SETTING_KEYS}
+    profile = KEYBOARD_PROFILES.get(overrides.get('profile', config['profile']))
+    if profile:
+        settings.update(profile.settings)
+    settings.update(overrides)
+    return settings
+
+def apply_editor_transforms(text, settings):
+    """Apply the configured editor transforms to slot text (lib/editor_transforms.py
+    is imported on first use)"""
+    mode = settings.get('indent_mode', 'keep')
+    if mode not in ('keep', 'strip', 'relative'):
+        print(f"[WARNING] Unknown indent_mode: {mode}")
+        mode = 'keep'
+    tabs = settings.get('indent_tabs', False)
+    pairs = settings.get('auto_close', '')
+    if '{' in pairs or '}' in pairs:
+        # Braces are {command} syntax once modifier keys are enabled
+        print("[WARNING] auto_close cannot include braces; ignoring {}")
+        pairs = ''.join(pairs[i:i + 2] for i in range(0, len(pairs) - 1, 2)
+                        if '{' not in pairs[i:i + 2] and '}' not in pairs[i:i + 2])
+    if mode == 'keep' and not tabs and not pairs:
+        return text
+    if not settings.get('enable_modifier_keys', False):
+        print("[WARNING] Editor transforms need enable_modifier_keys")
+        return text
+    try:
+        import editor_transforms
+    except ImportError:
+        print("[WARNING] Editor transforms need lib/editor_transforms.py")
+        return text
+    text = editor_transforms.transform_indentation(
+        text, mode, max(1, int(settings.get('indent_width', 4))), tabs)
+    if pairs:
+        text = editor_transforms.transform_auto_close(text, pairs, find_brace_commands)
+    if mode == 'strip':
+        text += settings.get('reindent_sequence', '')
+    return text
+
+def compile_text(text, settings, chain=(), includes=None):
+    """Run slot text through the conversions and compile it.
+
+    `chain` lists the slots being compiled, outermost first, for include
+    cycle detection; the (slot, source key) of every included slot is
+    appended to `includes`. Returns (code, char_table, unmapped character
+    count); raises ValueError if the macro does not compile.
+    """
+    enable_modifier_keys = settings.get('enable_modifier_keys', False)
+    add_final_enter = settings.get('add_final_enter', False)
+    japanese_keyboard = settings.get('japanese_keyboard', True)
     
-    # Extract ASCII characters only
-    processed_text = extract_ascii_chars(text)
+    with profile('kana'):
+        text = convert_kana(text, settings)
+
+    # Transliterate to ASCII; characters without an equivalent are dropped
+    with profile('extract_ascii'):
+        processed_text, unmapped = extract_ascii_chars(text)
+    if unmapped:
+        print(f"[WARNING] {unmapped} characters have no ASCII equivalent and are skipped")
     
     # Symbol conversion only for English keyboard
-    if not japanese_keyboard and enable_modifier_keys:
-        processed_text = convert_for_japanese_keyboard_smart(processed_text)
-    elif not japanese_keyboard:
-        processed_text = convert_text_symbols(processed_text)
+    with profile('convert_symbols'):
+        if not japanese_keyboard and enable_modifier_keys:
+            processed_text = convert_for_japanese_keyboard_smart(processed_text)
+        elif not japanese_keyboard:
+            processed_text = convert_text_symbols(processed_text)
     
-    # Function key processing
-    if enable_modifier_keys:
-        tokens = process_function_keys(processed_text)
-        send_tokens(tokens, typing_delay, add_final_enter)
-    else:
-        print("[DEBUG] Normal mode - Simple character sending")
-        # Simple character sending
-        for char in processed_text:
-            try:
-                if char == '\n':
-                    if add_final_enter:
-                        keyboard.send(Keycode.ENTER)
-                        print("[DEBUG] Enter sent for newline processing")
-                    else:
-                        print("[DEBUG] Ignoring newline character")
-                        continue
-                else:
-                    send_character(char)
-                time.sleep(typing_delay)
-            except Exception as e:
-                print(f"[ERROR] Character send error: {char} - {e}")
-                continue
+    with profile('editor_transforms'):
+        processed_text = apply_editor_transforms(processed_text, settings)
+
+    char_table = JIS_CHAR_TABLE if japanese_keyboard else US_CHAR_TABLE
+    keyboard_profile = KEYBOARD_PROFILES.get(settings.get('profile'))
+    key_overrides = keyboard_profile.key_overrides if keyboard_profile else None
+    if includes is None:
+        includes = []
+    fragment_unmapped = [0]
+
+    def include(slot):
+        code, count = compile_fragment(slot, settings, chain, includes)
+        fragment_unmapped[0] += count
+        return code
+
+    with profile('compile'):
+        code = compile_macro(processed_text, enable_modifier_keys, add_final_enter,
+                             char_table, key_overrides, include)
+    return code, char_table, unmapped + fragment_unmapped[0]
+
+def compile_slot_text(text, settings=None, chain=(), includes=None):
+    """Compile slot text with the given (default: configured) settings.
+
+    Returns (code, char_table, unmapped character count), or None if the
+    macro does not compile.
+    """
+    if settings is None:
+        settings = slot_settings({})
+    try:
+        compiled = compile_text(text, settings, chain, includes)
+    except ValueError as e:
+        print(f"[ERROR] Macro compile failed, nothing sent: {e}")
+        return None
+    print(f"[DEBUG] Compiled macro: {len(compiled[0])} bytes")
+    return compiled
+
+# Compiled {include:N} fragments by (slot, settings signature):
+# (includes it was compiled from, code, unmapped character count)
+compiled_fragments = {}
+
+def includes_current(includes):
+    """Check that none of the given (slot, source key) pairs changed"""
+    for slot, source_key in includes:
+        if slot_source_key(slot) != source_key:
+            return False
+    return True
+
+def compile_fragment(slot, settings, chain, includes):
+    """Return (code, unmapped count) for an included slot.
+
+    The fragment is compiled with the including slot's settings (its own
+    front matter is ignored) and cached until it or anything it includes
+    changes.
+    """
+    if slot in chain:
+        raise ValueError(f"Include cycle: {' -> '.join(str(s) for s in chain + (slot,))}")
+    # The reindent sequence belongs at the end of the outermost slot only
+    settings = dict(settings)
+    settings['reindent_sequence'] = ''
+    key = (slot, tuple(settings_key(settings[name]) for name in SLOT_SETTING_KEYS))
+    cached = compiled_fragments.get(key)
+    if cached and includes_current(cached[0]):
+        includes.extend(cached[0])
+        return cached[1], cached[2]
+
+    source_key = slot_source_key(slot)
+    text = load_slot_text(slot) if source_key else None
+    if text is None:
+        raise ValueError(f"Included slot {slot} is empty")
+    overrides, body = parse_front_matter(text)
+    if overrides:
+        print(f"[WARNING] Settings of included slot {slot} are ignored")
+    fragment_includes = [(slot, source_key)]
+    code, _, unmapped = compile_text(body, settings, chain + (slot,), fragment_includes)
+    print(f"[DEBUG] Compiled include of slot {slot}: {len(code)} bytes")
+    compiled_fragments[key] = (fragment_includes, code, unmapped)
+    includes.extend(fragment_includes)
+    return code, unmapped
+
+class CompiledSlot:
+    """A slot's settings, bytecode and cost estimate, cached until its source changes"""
+
+    def __init__(self, source_key, settings, code, char_table, final_enter, unmapped=0,
+                 includes=()):
+        self.source_key = source_key
+        # (slot, source key) of every slot spliced in with {include:N}
+        self.includes = includes
+        self.settings = settings
+        self.code = code
+        self.char_table = char_table
+        self.final_enter = final_enter
+        self.unmapped = unmapped
+        self.flow = create_flow_control(settings)
+        with profile('estimate'):
+            self.reports, self.characters, self.estimated_ns = estimate_macro_cost(
+                code, char_table, settings, self.flow)
+
+# Compiled slots by slot number
+compiled_slots = {}
+
+def slot_source_key(slot):
+    """Identify the current source of a slot, or None if it has none"""
+    if slot in slot_table:
+        text = slot_table[slot]
+        return None if text is None else ('ram', slot_versions.get(slot, 0))
+    if slot_store and slot in slot_store:
+        location = slot_store.location(slot)
+        return None if location is None else ('log', slot_store.compactions, location)
+    try:
+        stat = os.stat(slot_filename(slot))
+    except OSError:
+        return None
+    return ('file', stat[6], stat[8])
+
+def load_compiled_slot(slot):
+    """Return the CompiledSlot for a slot, compiling it only when its source changed.
+
+    Returns None if the slot has no content; raises ValueError if it does
+    not compile.
+    """
+    source_key = slot_source_key(slot)
+    cached = compiled_slots.get(slot)
+    if cached and cached.source_key == source_key and includes_current(cached.includes):
+        return cached
+    compiled_slots.pop(slot, None)
+    text = load_slot_text(slot) if source_key else None
+    if text is None:
+        return None
+
+    with profile('front_matter'):
+        overrides, body = parse_front_matter(text)
+    if overrides:
+        print(f"[MAIN] Slot {slot} overrides: {overrides}")
+    settings = slot_settings(overrides)
+    includes = []
+    compiled = compile_slot_text(body, settings, (slot,), includes)
+    if compiled is None:
+        raise ValueError(f"Slot {slot} does not compile")
+    code, char_table, unmapped = compiled
+
+    # Keep the cache bounded: drop the other slots when it would grow too large
+    cached_bytes = sum(len(entry.code) for entry in compiled_slots.values())
+    cached_bytes += sum(len(fragment[1]) for fragment in compiled_fragments.values())
+    if cached_bytes + len(code) > COMPILED_CACHE_LIMIT:
+        compiled_slots.clear()
+        compiled_fragments.clear()
+    entry = CompiledSlot(source_key, settings, code, char_table,
+                         not body.endswith('\n'), unmapped, includes)
+    compiled_slots[slot] = entry
+    return entry
+
+def send_compiled_slot(slot, checkpoint=None):
+    """Send a compiled slot at its configured speed.
+
+    Returns False if the send paused at the checkpoint instead of finishing.
+    """
+    print(f"[MAIN] Estimated {slot.reports} reports, {slot.estimated_ns / 1000000000:.1f} s")
+    if slot.flow:
+        # Start every send from the configured pacing
+        slot.flow = create_flow_control(slot.settings)
+    with profile('send'):
+        errors = run_macro(slot.code, slot.char_table, slot.settings, slot.flow,
+                           slot.estimated_ns, checkpoint)
+    telemetry.add('chars_typed', slot.characters)
+    telemetry.add('reports_sent', slot.reports)
+    if slot.unmapped:
+        telemetry.add('chars_dropped', slot.unmapped)
+    if errors:
+        telemetry.add('send_errors', errors)
+    return not (checkpoint and checkpoint.paused)
+
+stream_flow = None
+
+def service_stream():
+    """Type the next chunk of streamed text.
+
+    Credit for the freed buffer space is granted before typing so the host
+    can refill the buffer while this chunk is being typed.
+    """
+    global stream_flow
+    text = stream_buffer.take()
+    if stream_buffer.dropped:
+        telemetry.add('chars_dropped', stream_buffer.dropped)
+        stream_buffer.dropped = 0
+    finished = stream_buffer.ending and stream_buffer.length == 0
+    if not finished and stream_buffer.free() != stream_buffer.credited:
+        data_channel.write(slot_protocol.encode_credit(stream_buffer.announce()))
+    if text:
+        settings = slot_settings({})
+        compiled = compile_slot_text(text, settings)
+        if compiled:
+            code, char_table, unmapped = compiled
+            if stream_flow is None:
+                stream_flow = create_flow_control(settings)
+            errors = run_macro(code, char_table, settings, stream_flow)
+            telemetry.add('chars_typed', len(text))
+            if unmapped:
+                telemetry.add('chars_dropped', unmapped)
+            if errors:
+                telemetry.add('send_errors', errors)
+    if finished:
+        stream_buffer.active = False
+        stream_flow = None
+        data_channel.write(slot_protocol.encode_credit(stream_buffer.announce()))
+        print("[STREAM] Complete")
+
+def dry_run_slot(slot):
+    """Show the estimated send duration without typing anything"""
+    print(f"[MAIN] Dry run: {slot.reports} reports, "
+          f"estimated {slot.estimated_ns / 1000000000:.1f} s")
+    show_estimate(slot.estimated_ns)
+
+def wait_for_release(button, long_press_time):
+    """Wait for a pressed button; return True once it has been held for long_press_time"""
+    deadline = time.monotonic() + long_press_time
+    while not button.value:
+        if time.monotonic() >= deadline:
+            return True
+        time.sleep(0.01)
+    return False
+
+def enter_idle_sleep():
+    """Light sleep until a button is pressed; returns the wake time in ns.
+
+    The Next, Send and slot input button pins are handed to PinAlarms for
+    the duration of the sleep and reconfigured afterwards. LED outputs keep
+    their state.
+    """
+    global button_next, button_send
+    print("[IDLE] Entering light sleep")
+    button_next.deinit()
+    button_send.deinit()
+    for slot_input in slot_inputs:
+        slot_input.deinit()
+    pins = [board.GP11, board.GP14] + [get_pin(name) for name in slot_input_wake_pins()]
+    try:
+        alarm.light_sleep_until_alarms(
+            *[alarm.pin.PinAlarm(pin=pin, value=False, pull=True) for pin in pins])
+    finally:
+        wake_ns = time.monotonic_ns()
+        button_next = create_button(board.GP11)
+        button_send = create_button(board.GP14)
+        for i, spec in enumerate(slot_input_specs):
+            slot_inputs[i] = create_slot_input(spec)
+    print("[IDLE] Woke up")
+    return wake_ns
+
+def report_wake_latency(wake_ns):
+    """Print the time from wake-up to the resulting button action"""
+    if wake_ns:
+        print(f"[IDLE] Wake-to-action latency: {(time.monotonic_ns() - wake_ns) / 1000000:.1f} ms")
+    return 0
 
 def main():
     global current_slot
     print("[MAIN] Starting main function...")
     
     try:
-        startup_delay = config['startup_delay']
-        print(f"[MAIN] Waiting {startup_delay} seconds for USB HID recognition...")
-        time.sleep(startup_delay)
+        report_boot_timings()
+        record_boot_telemetry()
+        export_telemetry()
 
         print("[MAIN] Initializing LEDs...")
         update_leds(current_slot)
@@ -477,33 +2414,105 @@ def main():
 
         last_next_state = True
         last_send_state = True
+        idle_sleep_after = config['idle_sleep_after'] if alarm else 0
+        if idle_sleep_after and slot_input_wake_pins() is None:
+            print("[IDLE] Idle sleep disabled: matrix and rotary slot inputs cannot wake the board")
+            idle_sleep_after = 0
+        last_activity = time.monotonic()
+        wake_ns = 0
         
         print("[MAIN] Entering main loop...")
 
         while True:
             pressed_next, last_next_state = button_pressed(button_next, last_next_state, "GP11 (Next Button)")
             pressed_send, last_send_state = button_pressed(button_send, last_send_state, "GP14 (Send Button)")
+            selected_slot = poll_slot_inputs(current_slot)
 
-            if pressed_next:
+            if pressed_next or pressed_send or selected_slot:
+                last_activity = time.monotonic()
+                wake_ns = report_wake_latency(wake_ns)
+            elif service_data_channel():
+                # Keep servicing the link without the loop delay while a host is talking
+                last_activity = time.monotonic()
+                continue
+            elif stream_buffer.has_work():
+                service_stream()
+                last_activity = time.monotonic()
+                continue
+            elif poll_serial_command():
+                last_activity = time.monotonic()
+            elif telemetry.dirty and time.monotonic() - last_activity >= TELEMETRY_FLUSH_IDLE:
+                telemetry.flush()
+            elif idle_sleep_after and time.monotonic() - last_activity >= idle_sleep_after \
+                    and not (data_channel and data_channel.connected):
+                telemetry.flush()
+                wake_ns = enter_idle_sleep()
+                # The waking press is still held: let edge detection see it
+                last_next_state = True
+                last_send_state = True
+                last_activity = time.monotonic()
+                continue
+
+            if pressed_next and PROFILE_NAMES \
+                    and wait_for_release(button_next, config['long_press_time']):
+                # Long press of Next cycles the keyboard profile
+                profile_names = [''] + PROFILE_NAMES
+                set_profile(profile_names[(profile_names.index(config['profile']) + 1)
+                                          % len(profile_names)])
+                # Briefly show the profile's LED (none lit: no profile)
+                active = KEYBOARD_PROFILES.get(config['profile'])
+                update_leds(active.index + 1 if active else 0)
+                wait_for_release(button_next, 2.0)
+                time.sleep(0.5)
+                update_leds(current_slot)
+            elif pressed_next:
                 current_slot += 1
-                if current_slot > 5:
+                if current_slot > SLOT_COUNT:
                     current_slot = 1
                 update_leds(current_slot)
                 print(f"[MAIN] Selected slot: {current_slot}")
                 time.sleep(0.2)
 
+            if selected_slot and selected_slot != current_slot:
+                # Direct selection is debounced by keypad/rotaryio: no settle delay
+                current_slot = selected_slot
+                update_leds(current_slot)
+                print(f"[MAIN] Selected slot: {current_slot}")
+
             if pressed_send:
-                filename = f"/slot{current_slot}.txt"
+                long_press = wait_for_release(button_send, config['long_press_time'])
+                filename = slot_filename(current_slot)
                 print(f"[MAIN] Attempting to send {filename}...")
-                text = read_file(filename)
-                if text is None:
-                    print(f"[ERROR] {filename} not found")
+                try:
+                    slot = load_compiled_slot(current_slot)
+                except ValueError as e:
+                    print(f"[ERROR] {e}")
+                    telemetry.add('send_errors')
                 else:
-                    print(f"[MAIN] Sending content of {filename}...")
-                    send_text_with_speed(text)
-                    if not text.endswith('\n'):
-                        keyboard.send(Keycode.ENTER)
-                    print(f"[MAIN] Send complete for {filename}")
+                    if slot is None:
+                        print(f"[ERROR] {filename} not found")
+                    elif long_press and send_checkpoint.can_resume(current_slot, slot.code):
+                        wait_for_release(button_send, 2.0)
+                        if send_compiled_slot(slot, send_checkpoint):
+                            if slot.final_enter:
+                                keyboard.send(Keycode.ENTER)
+                            print(f"[MAIN] Resumed send complete for {filename}")
+                    elif long_press:
+                        dry_run_slot(slot)
+                        wait_for_release(button_send, 2.0)
+                        time.sleep(2.0)
+                    else:
+                        print(f"[MAIN] Sending content of {filename}...")
+                        telemetry.add(f'sends_slot{current_slot}')
+                        send_checkpoint.start(current_slot, slot.code)
+                        if send_compiled_slot(slot, send_checkpoint):
+                            if slot.final_enter:
+                                keyboard.send(Keycode.ENTER)
+                            print(f"[MAIN] Send complete for {filename}")
+                        else:
+                            print("[MAIN] Send paused; long-press Send to resume")
+                update_leds(current_slot)
+                last_activity = time.monotonic()
                 time.sleep(0.2)
 
             time.sleep(0.05)
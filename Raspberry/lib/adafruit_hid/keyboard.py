@@ -9,6 +9,8 @@
 * Author(s): Scott Shawcroft, Dan Halbert
 """
 
+import time
+
 from micropython import const
 
 from . import find_device
@@ -22,6 +24,8 @@ except ImportError:
     pass
 
 _MAX_KEYPRESSES = const(6)
+_RETRY_BACKOFF_NS = const(1000000)  # first retry of a failed report after 1 ms, then doubling
+_MAX_BACKOFF_NS = const(32000000)
 
 
 class Keyboard:
@@ -38,11 +42,21 @@ class Keyboard:
 
     # No more than _MAX_KEYPRESSES regular keys may be pressed at once.
 
-    def __init__(self, devices: Sequence[usb_hid.Device], timeout: int = None) -> None:
+    def __init__(
+        self,
+        devices: Sequence[usb_hid.Device],
+        timeout: int = None,
+        queue_size: int = 4,
+        max_retries: int = 5,
+    ) -> None:
         """Create a Keyboard object that will send keyboard HID reports.
 
         :param timeout: Time in seconds to wait for USB to become ready before timing out.
           Defaults to None to wait indefinitely.
+        :param queue_size: Number of reports kept for retry when ``send_report()`` fails
+          (e.g. while the host is busy). When the queue is full, sending waits for room.
+        :param max_retries: Retries of a failed report, with exponential backoff,
+          before it is dropped and counted in ``dropped``.
 
         Devices can be a sequence of devices that includes a keyboard device or a keyboard device
         itself. A device is any object that implements ``send_report()``, ``usage_page`` and
@@ -67,6 +81,90 @@ class Keyboard:
         # No keyboard LEDs on.
         self._led_status = b"\x00"
 
+        # Ring buffer of reports waiting to be retried, in send order.
+        self._queue = bytearray(8 * queue_size)
+        self._queue_views = [memoryview(self._queue)[i * 8 : i * 8 + 8] for i in range(queue_size)]
+        self._queue_head = 0
+        self._max_retries = max_retries
+        # Failed attempts of the report at the head, and when to try it again.
+        self._attempts = 0
+        self._retry_ns = 0
+
+        self.retries = 0
+        """Number of report send attempts that were retries"""
+        self.dropped = 0
+        """Number of reports given up after ``max_retries`` retries"""
+        self.pending = 0
+        """Number of reports waiting to be retried (a plain attribute, cheap to poll)"""
+
+    def _send_report(self) -> None:
+        """Send the current report, queueing it for retry if the device is busy.
+
+        Reports are always delivered in order: while older reports are pending,
+        new ones join the queue. A full queue makes this wait for room.
+        """
+        if self.pending:
+            self._service_queue()
+        if not self.pending:
+            try:
+                self._keyboard_device.send_report(self.report)
+                return
+            except OSError:
+                self._attempts = 1
+                self._retry_ns = time.monotonic_ns() + _RETRY_BACKOFF_NS
+        elif self.pending == len(self._queue_views):
+            self._service_queue(len(self._queue_views) - 1)
+        tail = (self._queue_head + self.pending) % len(self._queue_views)
+        self._queue_views[tail][:] = self.report
+        self.pending += 1
+
+    def _service_queue(self, target: int = None) -> None:
+        """Retry pending reports in order.
+
+        Without a target, only retries that are due are attempted. With one,
+        wait through the backoff until at most ``target`` reports are pending.
+        """
+        while self.pending and (target is None or self.pending > target):
+            now = time.monotonic_ns()
+            if now < self._retry_ns:
+                if target is None:
+                    return
+                time.sleep((self._retry_ns - now) / 1000000000)
+                continue
+            try:
+                self._keyboard_device.send_report(self._queue_views[self._queue_head])
+            except OSError:
+                self.retries += 1
+                self._attempts += 1
+                if self._attempts <= self._max_retries:
+                    self._retry_ns = now + min(_RETRY_BACKOFF_NS << self._attempts, _MAX_BACKOFF_NS)
+                    continue
+                self.dropped += 1
+            self._queue_head = (self._queue_head + 1) % len(self._queue_views)
+            self.pending -= 1
+            self._attempts = 0
+            self._retry_ns = 0
+
+    def flush(self) -> bool:
+        """Deliver all pending reports, then a final report with every key released.
+
+        Each report gets the usual bounded retries. Returns False if the
+        all-released report itself could not be sent.
+        """
+        self._service_queue(0)
+        for i in range(8):
+            self.report[i] = 0
+        for attempt in range(self._max_retries + 1):
+            try:
+                self._keyboard_device.send_report(self.report)
+                return True
+            except OSError:
+                if attempt < self._max_retries:
+                    self.retries += 1
+                    time.sleep(min(_RETRY_BACKOFF_NS << attempt, _MAX_BACKOFF_NS) / 1000000000)
+        self.dropped += 1
+        return False
+
     def press(self, *keycodes: int) -> None:
         """Send a report indicating that the given keys have been pressed.
 
@@ -91,7 +189,7 @@ class Keyboard:
         """
         for keycode in keycodes:
             self._add_keycode_to_report(keycode)
-        self._keyboard_device.send_report(self.report)
+        self._send_report()
 
     def release(self, *keycodes: int) -> None:
         """Send a USB HID report indicating that the given keys have been released.
@@ -107,13 +205,13 @@ class Keyboard:
         """
         for keycode in keycodes:
             self._remove_keycode_from_report(keycode)
-        self._keyboard_device.send_report(self.report)
+        self._send_report()
 
     def release_all(self) -> None:
         """Release all pressed keys."""
         for i in range(8):
             self.report[i] = 0
-        self._keyboard_device.send_report(self.report)
+        self._send_report()
 
     def send(self, *keycodes: int) -> None:
         """Press the given keycodes and then release all pressed keys.
@@ -9,6 +9,37 @@
 * Author(s): Scott Shawcroft, Dan Halbert
 """
 
+try:
+    from typing import Optional
+except ImportError:
+    pass
+
+# BEGIN GENERATED KEYCODE TABLE
+# Constant names and their codes as '\nNAME=XX' entries (XX in hex),
+# searched with one str.find. Regenerate with tools/gen_keycode_table.py.
+_NAME_TABLE = (
+    "\nA=04\nALT=E2\nAPPLICATION=65\nB=05\nBACKSLASH=31\nBACKSPACE=2A\nC=06\nCAPS_LOCK=39"
+    "\nCOMMA=36\nCOMMAND=E3\nCONTROL=E0\nD=07\nDELETE=4C\nDOWN_ARROW=51\nE=08\nEIGHT=25"
+    "\nEND=4D\nENTER=28\nEQUALS=2E\nESCAPE=29\nF=09\nF1=3A\nF10=43\nF11=44\nF12=45\nF13=68"
+    "\nF14=69\nF15=6A\nF16=6B\nF17=6C\nF18=6D\nF19=6E\nF2=3B\nF20=6F\nF21=70\nF22=71\nF23=72"
+    "\nF24=73\nF3=3C\nF4=3D\nF5=3E\nF6=3F\nF7=40\nF8=41\nF9=42\nFIVE=22\nFORWARD_SLASH=38"
+    "\nFOUR=21\nG=0A\nGRAVE_ACCENT=35\nGUI=E3\nH=0B\nHOME=4A\nI=0C\nINSERT=49"
+    "\nINTERNATIONAL1=87\nINTERNATIONAL2=88\nINTERNATIONAL3=89\nINTERNATIONAL4=8A"
+    "\nINTERNATIONAL5=8B\nJ=0D\nK=0E\nKEYPAD_ASTERISK=55\nKEYPAD_BACKSLASH=64"
+    "\nKEYPAD_EIGHT=60\nKEYPAD_ENTER=58\nKEYPAD_EQUALS=67\nKEYPAD_FIVE=5D"
+    "\nKEYPAD_FORWARD_SLASH=54\nKEYPAD_FOUR=5C\nKEYPAD_MINUS=56\nKEYPAD_NINE=61"
+    "\nKEYPAD_NUMLOCK=53\nKEYPAD_ONE=59\nKEYPAD_PERIOD=63\nKEYPAD_PLUS=57\nKEYPAD_SEVEN=5F"
+    "\nKEYPAD_SIX=5E\nKEYPAD_THREE=5B\nKEYPAD_TWO=5A\nKEYPAD_ZERO=62\nL=0F\nLANG1=90"
+    "\nLANG2=91\nLEFT_ALT=E2\nLEFT_ARROW=50\nLEFT_BRACKET=2F\nLEFT_CONTROL=E0\nLEFT_GUI=E3"
+    "\nLEFT_SHIFT=E1\nM=10\nMINUS=2D\nN=11\nNINE=26\nO=12\nONE=1E\nOPTION=E2\nP=13"
+    "\nPAGE_DOWN=4E\nPAGE_UP=4B\nPAUSE=48\nPERIOD=37\nPOUND=32\nPOWER=66\nPRINT_SCREEN=46"
+    "\nQ=14\nQUOTE=34\nR=15\nRETURN=28\nRIGHT_ALT=E6\nRIGHT_ARROW=4F\nRIGHT_BRACKET=30"
+    "\nRIGHT_CONTROL=E4\nRIGHT_GUI=E7\nRIGHT_SHIFT=E5\nS=16\nSCROLL_LOCK=47\nSEMICOLON=33"
+    "\nSEVEN=24\nSHIFT=E1\nSIX=23\nSPACE=2C\nSPACEBAR=2C\nT=17\nTAB=2B\nTHREE=20\nTWO=1F"
+    "\nU=18\nUP_ARROW=52\nV=19\nW=1A\nWINDOWS=E3\nX=1B\nY=1C\nZ=1D\nZERO=27\n"
+)
+# END GENERATED KEYCODE TABLE
+
 
 class Keycode:
     """USB HID Keycode constants.
@@ -264,6 +295,20 @@ class Keycode:
     """Function key F23"""
     F24 = 0x73
     """Function key F24"""
+    INTERNATIONAL1 = 0x87
+    """``ろ`` (Ro) key (JIS)"""
+    INTERNATIONAL2 = 0x88
+    """Katakana/Hiragana key (JIS)"""
+    INTERNATIONAL3 = 0x89
+    """Yen key (JIS)"""
+    INTERNATIONAL4 = 0x8A
+    """Henkan (convert) key (JIS)"""
+    INTERNATIONAL5 = 0x8B
+    """Muhenkan (no convert) key (JIS)"""
+    LANG1 = 0x90
+    """Kana key (Mac JIS): switches the input method to Japanese"""
+    LANG2 = 0x91
+    """Eisu key (Mac JIS): switches the input method to alphanumeric"""
 
     LEFT_CONTROL = 0xE0
     """Control modifier left of the spacebar"""
@@ -300,4 +345,15 @@ class Keycode:
     def modifier_bit(cls, keycode: int) -> int:
         """Return the modifer bit to be set in an HID keycode report if this is a
         modifier key; otherwise return 0."""
-        return 1 << (keycode - 0xE0) if cls.LEFT_CONTROL <= keycode <= cls.RIGHT_GUI else 0
+        # Literal bounds (LEFT_CONTROL..RIGHT_GUI) so trimmed copies keep working
+        return 1 << (keycode - 0xE0) if 0xE0 <= keycode <= 0xE7 else 0
+
+    @staticmethod
+    def from_name(name: str) -> Optional[int]:
+        """Return the keycode for a constant name such as ``"LEFT_SHIFT"``, or None if
+        there is no such key. Works for every name, even in trimmed copies of this class."""
+        start = _NAME_TABLE.find("\n" + name + "=")
+        if start < 0:
+            return None
+        start += len(name) + 2
+        return int(_NAME_TABLE[start : start + 2], 16)
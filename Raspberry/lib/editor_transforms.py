@@ -0,0 +1,93 @@
+"""
+`editor_transforms`
+====================================================
+
+Rewrites slot text for editors that indent and close brackets by
+themselves (``indent_mode``, ``indent_tabs`` and ``auto_close``), using
+``{backspace}``, ``{right}``, ``{delete}`` and ``{end}`` commands.
+
+code.py imports this module only when a slot enables a transform, so the
+module can be shipped as .mpy and costs no heap otherwise.
+"""
+
+
+def split_indent(line):
+    """Split a line into its leading whitespace and the rest"""
+    body = line.lstrip(" \t")
+    return line[:len(line) - len(body)], body
+
+
+def transform_indentation(text, mode, width, tabs):
+    """Rewrite line indentation for editors that auto-indent after Enter"""
+    lines = text.split("\n")
+    previous = ""
+    for number, line in enumerate(lines):
+        indent, body = split_indent(line)
+        if tabs:
+            indent = indent.replace(" " * width, "\t")
+        if number == 0:
+            # The first line starts wherever the cursor is
+            lines[number] = indent + body
+            previous = indent
+        elif mode == "strip" or not body:
+            # Blank lines type nothing; the editor keeps the indentation
+            lines[number] = body
+        elif mode == "relative":
+            common = 0
+            while common < min(len(indent), len(previous)) and indent[common] == previous[common]:
+                common += 1
+            lines[number] = "{backspace}" * (len(previous) - common) + indent[common:] + body
+            previous = indent
+        else:
+            lines[number] = indent + body
+    return "\n".join(lines)
+
+
+def transform_auto_close(text, pairs, find_commands):
+    """Avoid typing closing brackets the editor inserts by itself.
+
+    Within a line, closers at the end are dropped in favour of one {end},
+    and other closers become {right} to step over the inserted one. An
+    opener closed on a later line (or never) is followed by {delete} to
+    remove the editor's closer. A closer equal to its opener (a quote)
+    closes the open one; nothing opens inside it. {command} spans, as
+    found by `find_commands(line)` (returning (start, end, command)
+    tuples), are left alone.
+    """
+    openers = pairs[0::2]
+    closers = pairs[1::2]
+    # Symmetric pairs (quotes): brackets inside them are not auto-closed
+    quotes = [opener for opener, closer in zip(openers, closers) if opener == closer]
+    lines = text.split("\n")
+    for number, line in enumerate(lines):
+        stack = []
+        closed = set()
+        commands = set()
+        for start, end, _ in find_commands(line):
+            commands.update(range(start, end))
+        for index, char in enumerate(line):
+            if index in commands:
+                continue
+            # Closing first, so a quote closes the open quote of a symmetric pair
+            if char in closers and stack and line[stack[-1]] == openers[closers.index(char)]:
+                stack.pop()
+                closed.add(index)
+            elif char in openers and not (stack and line[stack[-1]] in quotes):
+                stack.append(index)
+        if not closed and not stack:
+            continue
+        end = len(line)
+        while end and end - 1 in closed:
+            end -= 1
+        parts = []
+        for index in range(end):
+            if index in closed:
+                parts.append("{right}")
+            else:
+                parts.append(line[index])
+                if index in stack:
+                    parts.append("{delete}")
+        if end < len(line):
+            parts.append("{end}")
+        lines[number] = "".join(parts)
+    return "\n".join(lines)
@@ -0,0 +1,136 @@
+"""
+`kana_romaji`
+====================================================
+
+Kana to romaji conversion for ``kana_mode``: hiragana and katakana runs
+in slot text are typed as romaji for the host IME.
+
+code.py imports this module only when a slot uses kana_mode, so the table
+and trie cost no heap otherwise (and the module can be shipped as .mpy).
+"""
+
+
+# Romaji typed for each kana sequence, as 'KANA''romaji' entries split on
+# spaces; katakana are folded onto hiragana first. Two-kana entries (small
+# ya/yu/yo and vowels) win over their first kana alone. In-run punctuation
+# maps to the keys the IME turns into the full-width marks
+KANA_ROMAJI = (
+    "あa いi うu えe おo かka きki くku けke こko さsa しsi すsu せse そso "
+    "たta ちti つtu てte とto なna にni ぬnu ねne のno はha ひhi ふhu へhe ほho "
+    "まma みmi むmu めme もmo やya ゆyu よyo らra りri るru れre ろro わwa ゐwyi "
+    "ゑwye をwo がga ぎgi ぐgu げge ごgo ざza じzi ずzu ぜze ぞzo だda ぢdi づdu "
+    "でde どdo ばba びbi ぶbu べbe ぼbo ぱpa ぴpi ぷpu ぺpe ぽpo ゔvu "
+    "ぁxa ぃxi ぅxu ぇxe ぉxo ゃxya ゅxyu ょxyo ゎxwa ゕxka ゖxke "
+    "きゃkya きゅkyu きょkyo ぎゃgya ぎゅgyu ぎょgyo しゃsya しゅsyu しょsyo "
+    "しぇsye じゃja じゅju じょjo じぇje ちゃtya ちゅtyu ちょtyo ちぇtye "
+    "ぢゃdya ぢゅdyu ぢょdyo にゃnya にゅnyu にょnyo ひゃhya ひゅhyu ひょhyo "
+    "びゃbya びゅbyu びょbyo ぴゃpya ぴゅpyu ぴょpyo みゃmya みゅmyu みょmyo "
+    "りゃrya りゅryu りょryo ふぁfa ふぃfi ふぇfe ふぉfo ふゅfyu てぃthi てゅthu "
+    "でぃdhi でゅdhu とぅtwu どぅdwu うぃwhi うぇwhe うぉwho いぇye つぁtsa "
+    "つぃtsi つぇtse つぉtso ゔぁva ゔぃvi ゔぇve ゔぉvo くぁqa くぃqi くぇqe "
+    "くぉqo ぐぁgwa ー- 、, 。. 「[ 」] ・/ 〜~"
+)
+KANA_SMALL_TSU = "っ"
+KANA_N = "ん"
+# Romaji starts after which っ doubles the consonant and a lone 'n' is ん
+ROMAJI_CONSONANTS = "bcdfghjkmpqrstvwxz"
+
+
+def _build_trie():
+    """Return the kana trie: {kana: [romaji, {next kana: romaji} or None]}"""
+    trie = {}
+    for entry in KANA_ROMAJI.split(" "):
+        split = 0
+        while ord(entry[split]) > 127:
+            split += 1
+        kana, romaji = entry[:split], entry[split:]
+        node = trie.get(kana[0])
+        if node is None:
+            node = trie[kana[0]] = [None, None]
+        if len(kana) == 1:
+            node[0] = romaji
+        else:
+            if node[1] is None:
+                node[1] = {}
+            node[1][kana[1]] = romaji
+    return trie
+
+
+# Built on import; the module is only imported once kana_mode is used
+_TRIE = _build_trie()
+
+
+def fold_katakana(char):
+    """Return the hiragana for a katakana character (others unchanged)"""
+    if "\u30a1" <= char <= "\u30f6":
+        return chr(ord(char) - 0x60)
+    return char
+
+
+def kana_to_romaji(text, ime_on="", ime_off=""):
+    """Replace kana runs with romaji in one left-to-right pass.
+
+    Each run is wrapped in ime_on/ime_off. A small tsu doubles the next
+    syllable's consonant and ん becomes 'nn' unless a consonant follows;
+    both are resolved when the next syllable (or the end of the run) is seen.
+    """
+    trie = _TRIE
+    parts = []
+    in_run = False
+    tsu = 0
+    pending_n = False
+    length = len(text)
+    i = 0
+    while i < length:
+        char = fold_katakana(text[i])
+        if char == KANA_SMALL_TSU or char == KANA_N or char in trie:
+            if not in_run:
+                parts.append(ime_on)
+                in_run = True
+            i += 1
+            if char == KANA_SMALL_TSU:
+                tsu += 1
+                continue
+            if char == KANA_N:
+                if pending_n:
+                    parts.append("nn")
+                if tsu:
+                    parts.append("xtu" * tsu)
+                    tsu = 0
+                pending_n = True
+                continue
+            romaji, children = trie[char]
+            if children and i < length:
+                longer = children.get(fold_katakana(text[i]))
+                if longer:
+                    romaji = longer
+                    i += 1
+            if pending_n:
+                parts.append("n" if romaji[0] in ROMAJI_CONSONANTS else "nn")
+                pending_n = False
+            if tsu:
+                if romaji[0] in ROMAJI_CONSONANTS:
+                    parts.append("xtu" * (tsu - 1) + romaji[0])
+                else:
+                    parts.append("xtu" * tsu)
+                tsu = 0
+            parts.append(romaji)
+            continue
+        if in_run:
+            if pending_n:
+                parts.append("nn")
+                pending_n = False
+            if tsu:
+                parts.append("xtu" * tsu)
+                tsu = 0
+            parts.append(ime_off)
+            in_run = False
+        parts.append(text[i])
+        i += 1
+    if in_run:
+        if pending_n:
+            parts.append("nn")
+        if tsu:
+            parts.append("xtu" * tsu)
+        parts.append(ime_off)
+    return "".join(parts)
@@ -0,0 +1,219 @@
+"""
+`slot_log`
+====================================================
+
+Append-only, log-structured store for slots written on the device.
+
+Every update appends one record instead of rewriting a slot file, so
+repeated edits spread over fresh flash rather than rewriting the same
+sectors. Record layout (little-endian)::
+
+    'SL' | type (1) | slot (1) | length (4) | payload | crc32 (4)
+
+The CRC covers the header and payload. A PUT record holds the slot's new
+content; a DELETE record (no payload) marks the slot deleted, hiding any
+``slotN.txt`` file as well. Only an in-RAM index of payload offsets is
+kept; content is read back from the log on demand.
+
+Power loss can only leave a torn record at the end of the log. Loading
+stops at the first record that is short or fails its CRC, and the next
+write compacts the log so nothing is appended after the damage.
+Compaction writes the live records to a temporary file and then replaces
+the log; if power fails before the replacement, the old log is used and
+the temporary file is discarded, and if it fails after the old log was
+removed, the complete temporary file becomes the log.
+
+This module only uses what both CircuitPython and CPython provide, so the
+host tools can read a copied log too.
+"""
+
+import os
+import struct
+
+from slot_protocol import crc32
+
+MAGIC = b"SL"
+HEADER_FORMAT = "<2sBBI"
+HEADER_SIZE = 8
+CRC_SIZE = 4
+RECORD_PUT = 1
+RECORD_DELETE = 2
+TEMP_SUFFIX = ".tmp"
+_CHUNK_SIZE = 256
+
+_sync = getattr(os, "sync", None)
+
+
+def _exists(path):
+    try:
+        os.stat(path)
+        return True
+    except OSError:
+        return False
+
+
+class SlotLog:
+    """Slot store kept as a log of CRC-checked records.
+
+    The log is compacted once it is larger than `compact_size` bytes and
+    more than half of it is superseded records.
+    """
+
+    def __init__(self, path, compact_size=16384):
+        self.path = path
+        self.compact_size = compact_size
+        # slot -> (payload offset, length), or None for a deleted slot
+        self.index = {}
+        self.size = 0
+        self.live_bytes = 0
+        self.torn = False
+        # Incremented by every compaction, which moves all records
+        self.compactions = 0
+        self.load()
+
+    def load(self):
+        """Rebuild the index from the log, recovering an interrupted compaction"""
+        temp_path = self.path + TEMP_SUFFIX
+        try:
+            if _exists(self.path):
+                if _exists(temp_path):
+                    os.remove(temp_path)
+            elif _exists(temp_path):
+                os.rename(temp_path, self.path)
+        except OSError:
+            # Read-only filesystem: recover on the next writable boot
+            pass
+
+        self.index = {}
+        self.size = 0
+        self.torn = False
+        try:
+            f = open(self.path, "rb")
+        except OSError:
+            return
+        with f:
+            while True:
+                header = f.read(HEADER_SIZE)
+                if not header:
+                    break
+                record = self._check_record(f, header)
+                if record is None:
+                    self.torn = True
+                    break
+                record_type, slot, length = record
+                if record_type == RECORD_PUT:
+                    self.index[slot] = (self.size + HEADER_SIZE, length)
+                else:
+                    self.index[slot] = None
+                self.size += HEADER_SIZE + length + CRC_SIZE
+        self._count_live_bytes()
+
+    def _check_record(self, f, header):
+        """Return (type, slot, length) if the record starting with header is intact"""
+        if len(header) < HEADER_SIZE:
+            return None
+        magic, record_type, slot, length = struct.unpack(HEADER_FORMAT, header)
+        if magic != MAGIC or record_type not in (RECORD_PUT, RECORD_DELETE):
+            return None
+        crc = crc32(header)
+        remaining = length
+        while remaining:
+            chunk = f.read(min(remaining, _CHUNK_SIZE))
+            if not chunk:
+                return None
+            crc = crc32(chunk, crc)
+            remaining -= len(chunk)
+        trailer = f.read(CRC_SIZE)
+        if len(trailer) < CRC_SIZE or struct.unpack("<I", trailer)[0] != crc:
+            return None
+        return record_type, slot, length
+
+    def _count_live_bytes(self):
+        self.live_bytes = 0
+        for entry in self.index.values():
+            self.live_bytes += HEADER_SIZE + CRC_SIZE + (entry[1] if entry else 0)
+
+    def __contains__(self, slot):
+        return slot in self.index
+
+    def location(self, slot):
+        """Return the payload offset of a slot's current record (changes on every write)"""
+        entry = self.index.get(slot)
+        return entry[0] if entry else None
+
+    def read(self, slot):
+        """Return a slot's content, or None if it is deleted or not in the log"""
+        entry = self.index.get(slot)
+        if entry is None:
+            return None
+        offset, length = entry
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            return f.read(length)
+
+    @staticmethod
+    def _encode(record_type, slot, data=b""):
+        header = struct.pack(HEADER_FORMAT, MAGIC, record_type, slot, len(data))
+        return header + data + struct.pack("<I", crc32(data, crc32(header)))
+
+    def _append(self, record_type, slot, data=b""):
+        if self.torn:
+            # Never append after a torn record: it would hide everything after it
+            self.compact()
+        record = self._encode(record_type, slot, data)
+        try:
+            with open(self.path, "ab") as f:
+                f.write(record)
+                f.flush()
+        except OSError:
+            # Part of the record may have reached the log
+            self.torn = True
+            raise
+        if _sync:
+            _sync()
+        if record_type == RECORD_PUT:
+            self.index[slot] = (self.size + HEADER_SIZE, len(data))
+        else:
+            self.index[slot] = None
+        self.size += len(record)
+        self._count_live_bytes()
+        if self.size > self.compact_size and self.size > 2 * self.live_bytes:
+            self.compact()
+
+    def put(self, slot, data):
+        """Store a slot's new content with a single append"""
+        self._append(RECORD_PUT, slot, bytes(data))
+
+    def delete(self, slot):
+        """Record a slot as deleted"""
+        self._append(RECORD_DELETE, slot)
+
+    def compact(self):
+        """Rewrite the log with only the current record of each slot"""
+        temp_path = self.path + TEMP_SUFFIX
+        index = {}
+        size = 0
+        with open(temp_path, "wb") as f:
+            for slot in sorted(self.index):
+                data = self.read(slot)
+                if data is None:
+                    record = self._encode(RECORD_DELETE, slot)
+                    index[slot] = None
+                else:
+                    record = self._encode(RECORD_PUT, slot, data)
+                    index[slot] = (size + HEADER_SIZE, len(data))
+                f.write(record)
+                size += len(record)
+            f.flush()
+        if _sync:
+            _sync()
+        if _exists(self.path):
+            os.remove(self.path)
+        os.rename(temp_path, self.path)
+        if _sync:
+            _sync()
+        self.index = index
+        self.size = size
+        self.torn = False
+        self.compactions += 1
+        self._count_live_bytes()
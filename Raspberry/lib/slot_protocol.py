@@ -0,0 +1,275 @@
+"""
+`slot_protocol`
+====================================================
+
+Framed binary protocol used on the ``usb_cdc.data`` channel to upload,
+list, read back and delete slots and to change settings without writing
+to the CIRCUITPY filesystem.
+
+Frame layout (little-endian)::
+
+    0xA5 0x5A | type (1) | seq (1) | length (2) | payload | crc32 (4)
+
+The CRC covers type, seq, length and payload. Every request is answered
+with exactly one ACK, NAK or DATA frame carrying the request's sequence
+number. A repeated request (same type, seq and payload) is answered from
+the last response without being applied again, so the host can retransmit
+safely. Hosts start each session at a random seq, and the payload check
+keeps a new request that happens to reuse the previous seq from being
+mistaken for a retransmission.
+
+Live streaming uses credit-based backpressure: the ACKs of STREAM_BEGIN and
+STREAM_DATA carry the free space (in bytes) of the device's fixed stream
+buffer, and the host never sends more than that. While the device types, it
+sends unsolicited CREDIT frames (seq 0) as buffer space frees up; after
+STREAM_END, a CREDIT equal to the whole buffer means everything was typed.
+
+This module is shared by the firmware and the host tools, so it only uses
+what both CircuitPython and CPython provide.
+"""
+
+import struct
+
+try:
+    from binascii import crc32 as _crc32
+except ImportError:
+    _crc32 = None
+
+SYNC = b"\xa5\x5a"
+HEADER_FORMAT = "<BBH"
+HEADER_SIZE = 4
+CRC_SIZE = 4
+MAX_PAYLOAD = 1024
+PROTOCOL_VERSION = 1
+
+# Host -> device requests
+MSG_PING = 0x01
+MSG_SLOT_BEGIN = 0x10   # slot (1), total length (4)
+MSG_SLOT_DATA = 0x11    # offset (4), bytes
+MSG_SLOT_END = 0x12     # crc32 of the whole slot (4)
+MSG_SLOT_LIST = 0x13
+MSG_SLOT_READ = 0x14    # slot (1), offset (4), max length (2)
+MSG_SLOT_DELETE = 0x15  # slot (1)
+MSG_CONFIG_SET = 0x20   # UTF-8 JSON object
+MSG_STREAM_BEGIN = 0x30
+MSG_STREAM_DATA = 0x31  # UTF-8 text
+MSG_STREAM_END = 0x32
+
+# Device -> host responses
+MSG_ACK = 0x80
+MSG_NAK = 0x81          # error code (1), UTF-8 message
+MSG_DATA = 0x82
+MSG_CREDIT = 0x83       # free stream buffer bytes (2), unsolicited with seq 0
+
+# NAK error codes
+ERR_CRC = 1
+ERR_SEQUENCE = 2
+ERR_BAD_REQUEST = 3
+ERR_NOT_FOUND = 4
+ERR_TOO_LARGE = 5
+
+_CRC_TABLE = None
+
+# Malformed payloads surface as any of these while being unpacked
+_REQUEST_ERRORS = (ValueError, IndexError, getattr(struct, "error", ValueError))
+
+
+def crc32(data, crc=0):
+    """CRC-32 (same polynomial as zlib), with a table fallback for builds without binascii"""
+    if _crc32 is not None:
+        return _crc32(data, crc) & 0xFFFFFFFF
+    global _CRC_TABLE  # pylint: disable=global-statement
+    if _CRC_TABLE is None:
+        _CRC_TABLE = []
+        for n in range(256):
+            c = n
+            for _ in range(8):
+                c = (c >> 1) ^ 0xEDB88320 if c & 1 else c >> 1
+            _CRC_TABLE.append(c)
+    crc ^= 0xFFFFFFFF
+    for byte in data:
+        crc = _CRC_TABLE[(crc ^ byte) & 0xFF] ^ (crc >> 8)
+    return crc ^ 0xFFFFFFFF
+
+
+def encode_frame(msg_type, seq, payload=b""):
+    """Return the bytes of one frame"""
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError("Payload too large")
+    header = struct.pack(HEADER_FORMAT, msg_type, seq & 0xFF, len(payload))
+    crc = crc32(payload, crc32(header))
+    return SYNC + header + bytes(payload) + struct.pack("<I", crc)
+
+
+def encode_credit(credit, msg_type=MSG_CREDIT, seq=0):
+    """Return a frame announcing the free stream buffer space"""
+    return encode_frame(msg_type, seq, struct.pack("<H", credit))
+
+
+class FrameParser:
+    """Incremental frame decoder.
+
+    `feed` returns a list of ``(type, seq, payload)`` tuples. A frame whose
+    CRC does not match is returned with type ``None`` so it can be NAKed.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        """Add received bytes and return the complete frames"""
+        # Slices are reassigned rather than deleted: CircuitPython bytearrays
+        # do not support slice deletion
+        buffer = self._buffer
+        buffer.extend(data)
+        frames = []
+        while True:
+            start = bytes(buffer).find(SYNC)
+            if start < 0:
+                # Keep a trailing first sync byte; it may start the next frame
+                buffer[:max(0, len(buffer) - 1)] = b""
+                return frames
+            if start:
+                buffer[:start] = b""
+            if len(buffer) < 2 + HEADER_SIZE:
+                return frames
+            msg_type, seq, length = struct.unpack_from(HEADER_FORMAT, buffer, 2)
+            if length > MAX_PAYLOAD:
+                # Not a real frame start: resynchronize on the next sync
+                buffer[:1] = b""
+                continue
+            end = 2 + HEADER_SIZE + length + CRC_SIZE
+            if len(buffer) < end:
+                return frames
+            payload = bytes(buffer[2 + HEADER_SIZE:end - CRC_SIZE])
+            (crc,) = struct.unpack_from("<I", buffer, end - CRC_SIZE)
+            if crc32(payload, crc32(bytes(buffer[2:2 + HEADER_SIZE]))) == crc:
+                frames.append((msg_type, seq, payload))
+            else:
+                frames.append((None, seq, b""))
+            buffer[:end] = b""
+
+
+class SlotServer:
+    """Device side of the protocol.
+
+    The store is any object providing ``slot_bytes(slot)`` (bytes or None),
+    ``store_slot(slot, data)``, ``delete_slot(slot)`` (bool),
+    ``slot_numbers()`` and ``apply_config(settings)``, and for streaming
+    ``stream_begin()``, ``stream_data(data)`` and ``stream_end()``, each
+    returning the free stream buffer space. Store methods raise ValueError to
+    reject a request.
+    """
+
+    def __init__(self, store, max_slot_size=65536):
+        self.store = store
+        self.max_slot_size = max_slot_size
+        self._parser = FrameParser()
+        self._last_request = None
+        self._last_response = b""
+        self._upload_slot = 0
+        self._upload = None
+        self._received = 0
+
+    def feed(self, data):
+        """Process received bytes and return the response bytes to send"""
+        responses = b""
+        for msg_type, seq, payload in self._parser.feed(data):
+            if msg_type is None:
+                responses += self._nak(seq, ERR_CRC, "CRC mismatch")
+                continue
+            request = (msg_type, seq, crc32(payload))
+            if request == self._last_request:
+                # Retransmission: answer again without reapplying
+                responses += self._last_response
+                continue
+            try:
+                response = self._handle(msg_type, seq, payload)
+            except _REQUEST_ERRORS as e:
+                response = self._nak(seq, ERR_BAD_REQUEST, str(e))
+            self._last_request = request
+            self._last_response = response
+            responses += response
+        return responses
+
+    @staticmethod
+    def _nak(seq, error, message):
+        return encode_frame(MSG_NAK, seq, bytes([error]) + message.encode("utf-8"))
+
+    def _handle(self, msg_type, seq, payload):
+        """Apply one request and return its encoded response"""
+        # pylint: disable=too-many-return-statements
+        if msg_type == MSG_PING:
+            return encode_frame(MSG_ACK, seq, bytes([PROTOCOL_VERSION]))
+
+        if msg_type == MSG_SLOT_BEGIN:
+            slot, total = struct.unpack("<BI", payload)
+            if total > self.max_slot_size:
+                return self._nak(seq, ERR_TOO_LARGE, "Slot too large")
+            self._upload_slot = slot
+            self._upload = bytearray(total)
+            self._received = 0
+            return encode_frame(MSG_ACK, seq)
+
+        if msg_type == MSG_SLOT_DATA:
+            (offset,) = struct.unpack_from("<I", payload)
+            chunk = payload[4:]
+            if self._upload is None or offset != self._received:
+                return self._nak(seq, ERR_SEQUENCE, "Unexpected offset")
+            if offset + len(chunk) > len(self._upload):
+                return self._nak(seq, ERR_TOO_LARGE, "Data beyond declared length")
+            self._upload[offset:offset + len(chunk)] = chunk
+            self._received += len(chunk)
+            return encode_frame(MSG_ACK, seq)
+
+        if msg_type == MSG_SLOT_END:
+            (expected_crc,) = struct.unpack("<I", payload)
+            upload = self._upload
+            self._upload = None
+            if upload is None or self._received != len(upload):
+                return self._nak(seq, ERR_SEQUENCE, "Incomplete upload")
+            if crc32(upload) != expected_crc:
+                return self._nak(seq, ERR_CRC, "Slot CRC mismatch")
+            self.store.store_slot(self._upload_slot, bytes(upload))
+            return encode_frame(MSG_ACK, seq)
+
+        if msg_type == MSG_SLOT_LIST:
+            entries = b""
+            for slot in self.store.slot_numbers():
+                data = self.store.slot_bytes(slot)
+                if data is not None:
+                    entries += struct.pack("<BII", slot, len(data), crc32(data))
+            return encode_frame(MSG_DATA, seq, entries)
+
+        if msg_type == MSG_SLOT_READ:
+            slot, offset, max_length = struct.unpack("<BIH", payload)
+            data = self.store.slot_bytes(slot)
+            if data is None:
+                return self._nak(seq, ERR_NOT_FOUND, "No such slot")
+            max_length = min(max_length, MAX_PAYLOAD)
+            return encode_frame(MSG_DATA, seq, data[offset:offset + max_length])
+
+        if msg_type == MSG_SLOT_DELETE:
+            if not self.store.delete_slot(payload[0]):
+                return self._nak(seq, ERR_NOT_FOUND, "No such slot")
+            return encode_frame(MSG_ACK, seq)
+
+        if msg_type == MSG_CONFIG_SET:
+            import json  # pylint: disable=import-outside-toplevel
+
+            settings = json.loads(payload.decode("utf-8"))
+            if not isinstance(settings, dict):
+                raise ValueError("Config must be a JSON object")
+            self.store.apply_config(settings)
+            return encode_frame(MSG_ACK, seq)
+
+        if msg_type == MSG_STREAM_BEGIN:
+            return encode_credit(self.store.stream_begin(), MSG_ACK, seq)
+
+        if msg_type == MSG_STREAM_DATA:
+            return encode_credit(self.store.stream_data(payload), MSG_ACK, seq)
+
+        if msg_type == MSG_STREAM_END:
+            return encode_credit(self.store.stream_end(), MSG_ACK, seq)
+
+        return self._nak(seq, ERR_BAD_REQUEST, "Unknown message type")
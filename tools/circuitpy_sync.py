@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""Sync slots and settings to a mounted CIRCUITPY drive in one batch.
+
+Every write to CIRCUITPY can make CircuitPython reload code.py, so instead
+of rewriting files one setting or slot at a time this tool diffs a desired
+state against the mount and writes only the files that changed. Each file
+is first written to a temporary name and then renamed over the original,
+and all renames happen back to back, so the device sees one short burst of
+writes and reloads at most once.
+
+Usage::
+
+    circuitpy_sync.py [--mount DIR] [--state FILE] [--slot N=FILE ...]
+                      [--clear-slot N ...] [--set KEY=VALUE ...] [--dry-run]
+
+The state file is JSON::
+
+    {"slots": {"1": "text", "2": null}, "config": {"typing_delay": 0.02}}
+
+A null slot removes the slot file. Settings are merged into the existing
+config.json; keys not mentioned are kept.
+"""
+
+import argparse
+import getpass
+import json
+import os
+import sys
+
+from slot_link import parse_setting
+
+SLOT_COUNT = 5
+CONFIG_FILE = "config.json"
+TEMP_SUFFIX = ".sync-tmp"
+DEFAULT_MOUNTS = ("/media/{user}/CIRCUITPY", "/run/media/{user}/CIRCUITPY", "/mnt/CIRCUITPY")
+
+
+class SyncError(Exception):
+    """Raised for an invalid desired state or an unusable mount"""
+
+
+def slot_path(mount, slot):
+    """Return the file backing a slot on the mount"""
+    return os.path.join(mount, f"slot{slot}.txt")
+
+
+def read_bytes(path):
+    """Return a file's content, or None if it does not exist"""
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def encode_config(config):
+    """Serialize config.json the way the Windows app writes it (UTF-8, no BOM)"""
+    return json.dumps(config, indent=2, ensure_ascii=False).encode("utf-8")
+
+
+def plan_sync(mount, slots=None, settings=None):
+    """Return the [(path, bytes or None), ...] changes needed to reach the desired state.
+
+    `slots` maps slot numbers to text (None removes the slot); `settings`
+    is merged into the existing config.json. Files that already hold the
+    desired content are left out.
+    """
+    changes = []
+    for slot, text in sorted((slots or {}).items()):
+        if not 1 <= slot <= SLOT_COUNT:
+            raise SyncError(f"Slot must be 1-{SLOT_COUNT}: {slot}")
+        path = slot_path(mount, slot)
+        data = None if text is None else text.encode("utf-8")
+        if read_bytes(path) != data:
+            changes.append((path, data))
+
+    if settings:
+        path = os.path.join(mount, CONFIG_FILE)
+        current = read_bytes(path)
+        try:
+            config = json.loads(current.decode("utf-8-sig")) if current else {}
+        except ValueError as e:
+            raise SyncError(f"{path} is not valid JSON: {e}") from e
+        merged = dict(config)
+        merged.update(settings)
+        if merged != config:
+            changes.append((path, encode_config(merged)))
+    return changes
+
+
+def apply_plan(changes):
+    """Write all changes: stage every file, then rename them into place together"""
+    staged = []
+    try:
+        for path, data in changes:
+            if data is None:
+                continue
+            temp_path = path + TEMP_SUFFIX
+            with open(temp_path, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            staged.append(temp_path)
+    except OSError:
+        for temp_path in staged:
+            os.remove(temp_path)
+        raise
+
+    for path, data in changes:
+        if data is None:
+            if os.path.exists(path):
+                os.remove(path)
+        else:
+            os.replace(path + TEMP_SUFFIX, path)
+    # Flush the batch to the device in one go
+    os.sync()
+
+
+def find_mount():
+    """Return the first existing default CIRCUITPY mount point"""
+    user = getpass.getuser()
+    for pattern in DEFAULT_MOUNTS:
+        path = pattern.format(user=user)
+        if os.path.isdir(path):
+            return path
+    raise SyncError("CIRCUITPY mount not found; pass --mount")
+
+
+def load_state(args):
+    """Build (slots, settings) from the state file and command-line options"""
+    slots = {}
+    settings = {}
+    if args.state:
+        with open(args.state, encoding="utf-8") as f:
+            state = json.load(f)
+        for slot, text in state.get("slots", {}).items():
+            slots[int(slot)] = text
+        settings.update(state.get("config", {}))
+    for item in args.slot:
+        slot, _, path = item.partition("=")
+        with open(path, encoding="utf-8") as f:
+            slots[int(slot)] = f.read()
+    for slot in args.clear_slot:
+        slots[slot] = None
+    settings.update(parse_setting(item) for item in args.set)
+    return slots, settings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--mount", help="CIRCUITPY mount point (default: auto-detect)")
+    parser.add_argument("--state", help="JSON file with the desired slots and config")
+    parser.add_argument("--slot", action="append", default=[], metavar="N=FILE", help="set a slot from a file")
+    parser.add_argument("--clear-slot", action="append", default=[], type=int, metavar="N", help="remove a slot")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE", help="change a setting")
+    parser.add_argument("--dry-run", action="store_true", help="only show what would change")
+    args = parser.parse_args(argv)
+
+    try:
+        mount = args.mount or find_mount()
+        slots, settings = load_state(args)
+        changes = plan_sync(mount, slots, settings)
+        for path, data in changes:
+            action = "remove" if data is None else f"write {len(data)} bytes"
+            print(f"{action}: {os.path.relpath(path, mount)}")
+        if not changes:
+            print("Up to date")
+        elif not args.dry_run:
+            apply_plan(changes)
+            print(f"Synced {len(changes)} file(s)")
+    except (SyncError, OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
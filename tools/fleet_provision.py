@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""Provision many mounted CIRCUITPY devices at once.
+
+Copies the firmware (boot.py, code.py), lib/ and the key map files from
+Raspberry/ to every device in parallel, one worker thread per device.
+lib/adafruit_hid/keycode.py is deployed as the trimmed copy made by
+gen_keycode_table.py, keeping only the constants the firmware uses. Each
+device keeps a manifest of the content hashes it was provisioned with
+(.provision.json), so only files that changed since then are written, and
+they are written with circuitpy_sync's staged batch so the device reloads
+at most once. config.json is only created when a device has none, so
+per-device settings survive reprovisioning.
+
+Usage::
+
+    fleet_provision.py [--mount DIR ...] [--search DIR ...] [--source DIR]
+                       [--jobs N] [--verify] [--dry-run] [--full-keycode]
+
+Without --mount, every CIRCUITPY* volume under the --search directories
+(default: the usual mount roots) is provisioned. Any directory works as a
+mount, so a set of temporary directories can stand in for devices.
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import getpass
+import hashlib
+import json
+import os
+import sys
+import time
+
+from circuitpy_sync import CONFIG_FILE, DEFAULT_MOUNTS, TEMP_SUFFIX, SyncError, apply_plan, read_bytes
+from gen_keycode_table import KEYCODE_RELATIVE, trimmed_keycode_source
+
+SOURCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Raspberry")
+MANIFEST_FILE = ".provision.json"
+MOUNT_PREFIX = "CIRCUITPY"
+FIRMWARE_EXTENSIONS = (".py", ".mpy", ".json")
+DEFAULT_JOBS = 8
+
+DeviceResult = collections.namedtuple("DeviceResult", "mount copied size seconds error")
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def collect_sources(source, trim_keycode=True):
+    """Return {relative path: bytes} of the files to provision, config.json excluded.
+
+    With `trim_keycode`, keycode.py is replaced by its trimmed deployment copy.
+    """
+    files = {}
+    for directory, dirnames, filenames in os.walk(source):
+        dirnames[:] = sorted(name for name in dirnames
+                             if name != "__pycache__" and not name.startswith("."))
+        for name in sorted(filenames):
+            if not name.endswith(FIRMWARE_EXTENSIONS) or name.endswith(TEMP_SUFFIX):
+                continue
+            path = os.path.join(directory, name)
+            relative = os.path.relpath(path, source).replace(os.sep, "/")
+            if relative == CONFIG_FILE:
+                continue
+            with open(path, "rb") as f:
+                files[relative] = f.read()
+    if trim_keycode and KEYCODE_RELATIVE in files:
+        files[KEYCODE_RELATIVE] = trimmed_keycode_source(source).encode("utf-8")
+    return files
+
+
+def load_manifest(mount):
+    """Return the {relative path: hash} a device was last provisioned with"""
+    data = read_bytes(os.path.join(mount, MANIFEST_FILE))
+    try:
+        return json.loads(data.decode("utf-8"))["files"] if data else {}
+    except (ValueError, KeyError, TypeError):
+        return {}
+
+
+def is_current(path, data, digest, recorded, verify):
+    """Check whether a device file already holds the given content"""
+    if verify:
+        return read_bytes(path) == data
+    if recorded != digest:
+        return False
+    try:
+        return os.path.getsize(path) == len(data)
+    except OSError:
+        return False
+
+
+def plan_device(mount, files, hashes, config_data=None, verify=False):
+    """Return the [(path, bytes), ...] writes that bring a device up to date.
+
+    Files whose manifest entry matches are skipped (with `verify`, device
+    content is compared instead). The manifest itself is written last, so an
+    interrupted run is redone next time.
+    """
+    recorded = load_manifest(mount)
+    changes = []
+    for relative, data in sorted(files.items()):
+        path = os.path.join(mount, *relative.split("/"))
+        if not is_current(path, data, hashes[relative], recorded.get(relative), verify):
+            changes.append((path, data))
+    config_path = os.path.join(mount, CONFIG_FILE)
+    if config_data is not None and not os.path.exists(config_path):
+        changes.append((config_path, config_data))
+    if changes or recorded != hashes:
+        manifest = json.dumps({"files": hashes}, indent=2, sort_keys=True).encode("utf-8")
+        changes.append((os.path.join(mount, MANIFEST_FILE), manifest))
+    return changes
+
+
+def provision_device(mount, files, hashes, config_data=None, verify=False, dry_run=False):
+    """Bring one device up to date; never raises, failures are reported in the result"""
+    start = time.monotonic()
+    copied = 0
+    size = 0
+    try:
+        if not os.path.isdir(mount):
+            raise SyncError(f"{mount} is not a directory")
+        changes = plan_device(mount, files, hashes, config_data, verify)
+        copied = sum(1 for path, _ in changes if not path.endswith(MANIFEST_FILE))
+        size = sum(len(data) for _, data in changes)
+        if changes and not dry_run:
+            for path, _ in changes:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            apply_plan(changes)
+        error = None
+    except (SyncError, OSError) as e:
+        error = str(e)
+    return DeviceResult(mount, copied, size, time.monotonic() - start, error)
+
+
+def find_mounts(roots):
+    """Return every CIRCUITPY* directory directly under the given roots"""
+    mounts = []
+    for root in roots:
+        try:
+            names = sorted(os.listdir(root))
+        except OSError:
+            continue
+        for name in names:
+            path = os.path.join(root, name)
+            if name.startswith(MOUNT_PREFIX) and os.path.isdir(path):
+                mounts.append(path)
+    return mounts
+
+
+def default_search_roots():
+    user = getpass.getuser()
+    return [os.path.dirname(pattern.format(user=user)) for pattern in DEFAULT_MOUNTS]
+
+
+def provision_all(mounts, files, config_data=None, verify=False, dry_run=False, jobs=DEFAULT_JOBS,
+                  report=None):
+    """Provision all mounts concurrently; returns the DeviceResults in completion order"""
+    hashes = {relative: content_hash(data) for relative, data in files.items()}
+    results = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = [pool.submit(provision_device, mount, files, hashes, config_data, verify, dry_run)
+                   for mount in mounts]
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if report:
+                report(result)
+    return results
+
+
+def print_result(result):
+    if result.error:
+        print(f"FAIL {result.mount}: {result.error} ({result.seconds:.2f} s)")
+    elif result.copied:
+        print(f"ok   {result.mount}: {result.copied} file(s), {result.size} bytes in {result.seconds:.2f} s")
+    else:
+        print(f"ok   {result.mount}: up to date ({result.seconds:.2f} s)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--mount", action="append", default=[], help="device mount point (repeatable)")
+    parser.add_argument("--search", action="append", default=[], metavar="DIR",
+                        help="directory to scan for CIRCUITPY* mounts (repeatable)")
+    parser.add_argument("--source", default=SOURCE_DIR, help="firmware directory (default: Raspberry/)")
+    parser.add_argument("--jobs", type=int, default=DEFAULT_JOBS, help="devices provisioned at once")
+    parser.add_argument("--verify", action="store_true", help="compare device content instead of the manifest")
+    parser.add_argument("--dry-run", action="store_true", help="only show what would be copied")
+    parser.add_argument("--full-keycode", action="store_true",
+                        help="deploy keycode.py with every constant instead of the trimmed copy")
+    args = parser.parse_args(argv)
+
+    mounts = args.mount or find_mounts(args.search or default_search_roots())
+    if not mounts:
+        print("Error: no CIRCUITPY mounts found; pass --mount or --search", file=sys.stderr)
+        return 1
+    try:
+        files = collect_sources(args.source, not args.full_keycode)
+        config_data = read_bytes(os.path.join(args.source, CONFIG_FILE))
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    start = time.monotonic()
+    results = provision_all(mounts, files, config_data, args.verify, args.dry_run, args.jobs,
+                            print_result)
+    failed = sum(1 for result in results if result.error)
+    print(f"{'Checked' if args.dry_run else 'Provisioned'} {len(results)} device(s) "
+          f"in {time.monotonic() - start:.2f} s, {failed} failed")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
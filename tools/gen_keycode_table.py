@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""Regenerate the Keycode name table and optionally trim unused constants.
+
+``Raspberry/lib/adafruit_hid/keycode.py`` carries a packed name-to-code
+string between generated markers, used by ``Keycode.from_name`` so names
+from the JSON settings resolve without ``hasattr``/``getattr``. This tool
+rebuilds that table from the ``Keycode`` class.
+
+With ``--trim`` it instead writes a deployment copy of keycode.py whose
+class keeps only the constants referenced as ``Keycode.NAME`` in the given
+sources (default: every other .py file of the firmware); every name stays
+resolvable through the table. The trimmed class is smaller in RAM.
+fleet_provision.py deploys this trimmed copy instead of the full module.
+
+Usage::
+
+    gen_keycode_table.py                      (update the table in place)
+    gen_keycode_table.py --trim OUTPUT [SOURCE ...]
+"""
+
+import argparse
+import importlib.util
+import os
+import re
+import sys
+
+RASPBERRY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Raspberry")
+KEYCODE_RELATIVE = "lib/adafruit_hid/keycode.py"
+KEYCODE_PY = os.path.join(RASPBERRY, *KEYCODE_RELATIVE.split("/"))
+
+BEGIN_MARKER = "# BEGIN GENERATED KEYCODE TABLE"
+END_MARKER = "# END GENERATED KEYCODE TABLE"
+CONSTANT_LINE = re.compile(r"^    ([A-Z][A-Z0-9_]*) = (\S+)$")
+DOCSTRING_LINE = re.compile(r'^    r?"""')
+REFERENCE = re.compile(r"\bKeycode\.([A-Z][A-Z0-9_]*)\b")
+TABLE_LINE_LENGTH = 88
+
+
+def load_keycodes(path=KEYCODE_PY):
+    """Return {name: code} for every constant of the Keycode class"""
+    spec = importlib.util.spec_from_file_location("keycode", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return {name: value for name, value in vars(module.Keycode).items()
+            if name.isupper() and isinstance(value, int)}
+
+
+def render_table(keycodes):
+    """Return the generated block defining _NAME_TABLE"""
+    entries = [f"\\n{name}={code:02X}" for name, code in sorted(keycodes.items())]
+    lines = [BEGIN_MARKER,
+             "# Constant names and their codes as '\\nNAME=XX' entries (XX in hex),",
+             "# searched with one str.find. Regenerate with tools/gen_keycode_table.py.",
+             "_NAME_TABLE = ("]
+    line = ""
+    for entry in entries:
+        if len(line) + len(entry) > TABLE_LINE_LENGTH:
+            lines.append(f'    "{line}"')
+            line = ""
+        line += entry
+    lines.append(f'    "{line}\\n"')
+    lines.append(")")
+    lines.append(END_MARKER)
+    return "\n".join(lines)
+
+
+def replace_table(source, keycodes):
+    """Return keycode.py source with a freshly generated table"""
+    start = source.index(BEGIN_MARKER)
+    end = source.index(END_MARKER) + len(END_MARKER)
+    return source[:start] + render_table(keycodes) + source[end:]
+
+
+def trim_constants(source, keycodes, keep):
+    """Drop class constants (and their docstrings) not in keep; kept aliases become literals"""
+    output = []
+    dropping = False
+    for line in source.split("\n"):
+        match = CONSTANT_LINE.match(line)
+        if match:
+            name = match.group(1)
+            dropping = name not in keep
+            if not dropping:
+                output.append(f"    {name} = 0x{keycodes[name]:02X}")
+            continue
+        if dropping and DOCSTRING_LINE.match(line):
+            continue
+        dropping = False
+        output.append(line)
+    return re.sub(r"\n{3,}(?=    )", "\n\n", "\n".join(output))
+
+
+def referenced_names(paths):
+    """Return the Keycode constant names used in the given source files"""
+    names = set()
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            names.update(REFERENCE.findall(f.read()))
+    return names
+
+
+def firmware_sources(firmware):
+    """Return the .py files of a firmware directory other than keycode.py"""
+    paths = []
+    for directory, dirnames, filenames in os.walk(firmware):
+        dirnames[:] = sorted(name for name in dirnames if not name.startswith((".", "__")))
+        for name in sorted(filenames):
+            path = os.path.join(directory, name)
+            relative = os.path.relpath(path, firmware).replace(os.sep, "/")
+            if name.endswith(".py") and relative != KEYCODE_RELATIVE:
+                paths.append(path)
+    return paths
+
+
+def trimmed_keycode_source(firmware=RASPBERRY, sources=None):
+    """Return the trimmed keycode.py of a firmware directory.
+
+    Keeps the constants referenced in `sources` (default: the firmware's
+    other .py files). Raises ValueError if a source references a constant
+    the Keycode class does not define.
+    """
+    keycode_py = os.path.join(firmware, *KEYCODE_RELATIVE.split("/"))
+    if sources is None:
+        sources = firmware_sources(firmware)
+    keycodes = load_keycodes(keycode_py)
+    keep = referenced_names(sources)
+    unknown = sorted(keep - set(keycodes))
+    if unknown:
+        raise ValueError(f"unknown Keycode constants referenced: {', '.join(unknown)}")
+    with open(keycode_py, encoding="utf-8") as f:
+        source = replace_table(f.read(), keycodes)
+    return trim_constants(source, keycodes, keep)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--trim", metavar="OUTPUT", help="write a trimmed keycode.py to OUTPUT")
+    parser.add_argument("sources", nargs="*", help="sources to scan for Keycode.NAME references")
+    args = parser.parse_args(argv)
+    if args.sources and not args.trim:
+        parser.error("sources are only used with --trim")
+
+    if args.trim:
+        try:
+            trimmed = trimmed_keycode_source(sources=args.sources or None)
+        except ValueError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            return 1
+        with open(args.trim, "w", encoding="utf-8") as f:
+            f.write(trimmed)
+        kept = sum(1 for line in trimmed.split("\n") if CONSTANT_LINE.match(line))
+        print(f"Kept {kept} of {len(load_keycodes())} constants in {args.trim}")
+    else:
+        keycodes = load_keycodes()
+        with open(KEYCODE_PY, encoding="utf-8") as f:
+            source = replace_table(f.read(), keycodes)
+        with open(KEYCODE_PY, "w", encoding="utf-8") as f:
+            f.write(source)
+        print(f"Wrote {len(keycodes)} names to {KEYCODE_PY}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""Host client for the portableClipboard slot data channel (usb_cdc.data).
+
+Pushes slots and settings to a running device without touching the
+CIRCUITPY drive, so the device neither writes flash nor reloads.
+
+Usage::
+
+    slot_link.py PORT ping
+    slot_link.py PORT list
+    slot_link.py PORT upload SLOT FILE
+    slot_link.py PORT read SLOT
+    slot_link.py PORT delete SLOT
+    slot_link.py PORT config KEY=VALUE [KEY=VALUE ...]
+    slot_link.py PORT stream FILE       (FILE may be '-' for stdin)
+    slot_link.py emulate
+
+PORT is the device's second CDC serial port (e.g. /dev/ttyACM1).
+``emulate`` opens a pty running the device-side protocol handler against an
+in-memory store and prints its path, as a stand-in device for testing.
+"""
+
+import argparse
+import json
+import os
+import select
+import struct
+import sys
+import tty
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Raspberry", "lib"))
+
+import slot_protocol as sp  # noqa: E402
+
+
+class LinkError(Exception):
+    """Raised when the device rejects a request or stops answering"""
+
+
+class SlotLink:
+    """Request/response client over a raw serial file descriptor"""
+
+    def __init__(self, fd, timeout=1.0, retries=3):
+        self.fd = fd
+        self.timeout = timeout
+        self.retries = retries
+        # Start where a previous session is unlikely to have stopped
+        self._seq = os.urandom(1)[0]
+        self._parser = sp.FrameParser()
+        self.credit = 0
+
+    @classmethod
+    def open(cls, path, **kwargs):
+        """Open a serial device (or pty) in raw mode"""
+        fd = os.open(path, os.O_RDWR | os.O_NOCTTY)
+        tty.setraw(fd)
+        return cls(fd, **kwargs)
+
+    def close(self):
+        os.close(self.fd)
+
+    def _read_response(self, seq, timeout=None):
+        """Wait for the response frame carrying seq; None on timeout.
+
+        Unsolicited CREDIT frames seen on the way update `credit`.
+        """
+        while True:
+            readable, _, _ = select.select([self.fd], [], [], timeout or self.timeout)
+            if not readable:
+                return None
+            for msg_type, frame_seq, payload in self._parser.feed(os.read(self.fd, 4096)):
+                if msg_type == sp.MSG_CREDIT:
+                    (self.credit,) = struct.unpack("<H", payload)
+                    if seq is None:
+                        return msg_type, payload
+                # Responses to earlier retransmissions are stale; skip them
+                elif frame_seq == seq:
+                    return msg_type, payload
+
+    def request(self, msg_type, payload=b""):
+        """Send one request and return (response type, payload), retransmitting on timeout"""
+        # Sequence 0 is reserved for unsolicited device frames
+        self._seq = self._seq % 255 + 1
+        frame = sp.encode_frame(msg_type, self._seq, payload)
+        for _ in range(self.retries):
+            os.write(self.fd, frame)
+            response = self._read_response(self._seq)
+            if response is None:
+                continue
+            response_type, response_payload = response
+            if response_type == sp.MSG_NAK:
+                if response_payload[:1] == bytes([sp.ERR_CRC]) and msg_type != sp.MSG_SLOT_END:
+                    # The request was corrupted in transit: send it again
+                    continue
+                raise LinkError(f"Device error {response_payload[0]}: "
+                                f"{response_payload[1:].decode('utf-8', 'replace')}")
+            if response_type is None:
+                continue
+            return response_type, response_payload
+        raise LinkError("No response from device")
+
+    def ping(self):
+        """Return the device protocol version"""
+        _, payload = self.request(sp.MSG_PING)
+        return payload[0]
+
+    def upload(self, slot, data):
+        """Upload a slot in CRC-checked chunks"""
+        self.request(sp.MSG_SLOT_BEGIN, struct.pack("<BI", slot, len(data)))
+        chunk_size = sp.MAX_PAYLOAD - 4
+        for offset in range(0, len(data), chunk_size):
+            self.request(sp.MSG_SLOT_DATA,
+                         struct.pack("<I", offset) + data[offset:offset + chunk_size])
+        self.request(sp.MSG_SLOT_END, struct.pack("<I", sp.crc32(data)))
+
+    def list_slots(self):
+        """Return [(slot, length, crc32), ...] for slots that have content"""
+        _, payload = self.request(sp.MSG_SLOT_LIST)
+        return [struct.unpack_from("<BII", payload, offset) for offset in range(0, len(payload), 9)]
+
+    def read_slot(self, slot):
+        """Read back a slot's content"""
+        data = b""
+        while True:
+            _, chunk = self.request(sp.MSG_SLOT_READ, struct.pack("<BIH", slot, len(data), sp.MAX_PAYLOAD))
+            data += chunk
+            if len(chunk) < sp.MAX_PAYLOAD:
+                return data
+
+    def delete_slot(self, slot):
+        self.request(sp.MSG_SLOT_DELETE, bytes([slot]))
+
+    def set_config(self, settings):
+        self.request(sp.MSG_CONFIG_SET, json.dumps(settings).encode("utf-8"))
+
+    def _stream_request(self, msg_type, payload=b""):
+        _, response = self.request(msg_type, payload)
+        (self.credit,) = struct.unpack("<H", response)
+
+    def _wait_credit(self, timeout):
+        if self._read_response(None, timeout) is None:
+            raise LinkError("Timed out waiting for stream credit")
+
+    def stream(self, chunks, drain_timeout=60.0):
+        """Stream text to be typed as it arrives, never exceeding the device's credit.
+
+        `chunks` is an iterable of bytes. Returns once the device has typed everything.
+        """
+        self._stream_request(sp.MSG_STREAM_BEGIN)
+        buffer_size = self.credit
+        for chunk in chunks:
+            while chunk:
+                while self.credit == 0:
+                    self._wait_credit(drain_timeout)
+                size = min(len(chunk), self.credit, sp.MAX_PAYLOAD)
+                self._stream_request(sp.MSG_STREAM_DATA, chunk[:size])
+                chunk = chunk[size:]
+        self._stream_request(sp.MSG_STREAM_END)
+        while self.credit < buffer_size:
+            self._wait_credit(drain_timeout)
+
+
+class MemoryStore:
+    """In-memory slot store for the emulated device"""
+
+    def __init__(self):
+        self.slots = {}
+        self.config = {}
+        self.streamed = b""
+
+    def slot_bytes(self, slot):
+        return self.slots.get(slot)
+
+    def store_slot(self, slot, data):
+        self.slots[slot] = data
+
+    def delete_slot(self, slot):
+        return self.slots.pop(slot, None) is not None
+
+    def slot_numbers(self):
+        return sorted(self.slots)
+
+    def apply_config(self, settings):
+        self.config.update(settings)
+
+    def stream_begin(self):
+        self.streamed = b""
+        return sp.MAX_PAYLOAD
+
+    def stream_data(self, data):
+        # The emulator "types" instantly, so the full credit is always free
+        self.streamed += data
+        return sp.MAX_PAYLOAD
+
+    def stream_end(self):
+        return sp.MAX_PAYLOAD
+
+
+def run_emulator(fd, store=None):
+    """Serve the device side of the protocol on fd until it closes"""
+    server = sp.SlotServer(store or MemoryStore())
+    while True:
+        try:
+            data = os.read(fd, 4096)
+        except OSError:
+            return
+        if not data:
+            return
+        responses = server.feed(data)
+        if responses:
+            os.write(fd, responses)
+
+
+def parse_setting(item):
+    """Parse KEY=VALUE, with VALUE as JSON when possible"""
+    key, _, value = item.partition("=")
+    try:
+        return key, json.loads(value)
+    except ValueError:
+        return key, value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("port", help="data channel serial port, or 'emulate'")
+    parser.add_argument("command", nargs="?", choices=["ping", "list", "upload", "read", "delete", "config", "stream"])
+    parser.add_argument("args", nargs="*")
+    args = parser.parse_args(argv)
+
+    if args.port == "emulate":
+        master, slave = os.openpty()
+        tty.setraw(master)
+        tty.setraw(slave)
+        print(f"Emulated device on {os.ttyname(slave)}", flush=True)
+        run_emulator(master)
+        return 0
+
+    link = SlotLink.open(args.port)
+    try:
+        if args.command == "ping":
+            print(f"Protocol version {link.ping()}")
+        elif args.command == "list":
+            for slot, length, crc in link.list_slots():
+                print(f"slot{slot}: {length} bytes, crc32 {crc:08x}")
+        elif args.command == "upload":
+            with open(args.args[1], "rb") as f:
+                link.upload(int(args.args[0]), f.read())
+        elif args.command == "read":
+            sys.stdout.write(link.read_slot(int(args.args[0])).decode("utf-8"))
+        elif args.command == "delete":
+            link.delete_slot(int(args.args[0]))
+        elif args.command == "config":
+            link.set_config(dict(parse_setting(item) for item in args.args))
+        elif args.command == "stream":
+            source = sys.stdin.buffer if args.args[0] == "-" else open(args.args[0], "rb")
+            with source:
+                link.stream(iter(lambda: source.read(sp.MAX_PAYLOAD), b""))
+        else:
+            parser.error("a command is required")
+    except LinkError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        link.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
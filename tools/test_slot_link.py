@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Tests for the slot data channel: SlotServer retransmission handling, and
+SlotLink sessions against the emulated device.
+
+Run with ``python3 -m unittest discover tools``.
+"""
+
+import os
+import struct
+import sys
+import threading
+import tty
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from slot_link import MemoryStore, SlotLink, run_emulator, sp  # noqa: E402
+
+
+class CountingStore(MemoryStore):
+    def __init__(self):
+        super().__init__()
+        self.config_updates = 0
+
+    def apply_config(self, settings):
+        self.config_updates += 1
+        super().apply_config(settings)
+
+
+def response(data):
+    """Decode the single frame in a server response"""
+    (frame,) = sp.FrameParser().feed(data)
+    return frame
+
+
+class SlotServerTest(unittest.TestCase):
+    def setUp(self):
+        self.store = CountingStore()
+        self.server = sp.SlotServer(self.store)
+
+    def test_retransmission_is_not_reapplied(self):
+        frame = sp.encode_frame(sp.MSG_CONFIG_SET, 1, b'{"a": 1}')
+        first = self.server.feed(frame)
+        self.assertEqual(self.server.feed(frame), first)
+        self.assertEqual(self.store.config_updates, 1)
+
+    def test_new_request_reusing_seq_is_applied(self):
+        self.server.feed(sp.encode_frame(sp.MSG_CONFIG_SET, 1, b'{"a": 1}'))
+        msg_type, seq, _ = response(self.server.feed(sp.encode_frame(sp.MSG_CONFIG_SET, 1, b'{"b": 2}')))
+        self.assertEqual((msg_type, seq), (sp.MSG_ACK, 1))
+        self.assertEqual(self.store.config, {"a": 1, "b": 2})
+
+    def test_read_reusing_seq_returns_requested_slot(self):
+        self.store.slots = {1: b"one", 2: b"two"}
+        for slot, expected in ((1, b"one"), (2, b"two")):
+            frame = sp.encode_frame(sp.MSG_SLOT_READ, 1, struct.pack("<BIH", slot, 0, sp.MAX_PAYLOAD))
+            self.assertEqual(response(self.server.feed(frame)), (sp.MSG_DATA, 1, expected))
+
+
+class EmulatorSessionTest(unittest.TestCase):
+    def setUp(self):
+        master, slave = os.openpty()
+        tty.setraw(master)
+        self.store = MemoryStore()
+        self.thread = threading.Thread(target=run_emulator, args=(master, self.store), daemon=True)
+        self.thread.start()
+        self.master = master
+        self.path = os.ttyname(slave)
+        self.slave = slave
+
+    def tearDown(self):
+        os.close(self.slave)
+        os.close(self.master)
+
+    def session(self, seq=None):
+        """Open a fresh link, as a separate CLI run would"""
+        link = SlotLink.open(self.path)
+        if seq is not None:
+            link._seq = seq  # pylint: disable=protected-access
+        self.addCleanup(link.close)
+        return link
+
+    def test_sessions_starting_at_the_same_seq(self):
+        self.session(0).set_config({"a": 1})
+        self.session(0).set_config({"b": 2})
+        self.assertEqual(self.store.config, {"a": 1, "b": 2})
+
+        self.session(0).upload(1, b"first slot")
+        self.session(0).upload(2, b"second slot")
+        self.assertEqual(self.session(0).read_slot(1), b"first slot")
+        self.assertEqual(self.session(0).read_slot(2), b"second slot")
+
+    def test_upload_and_list(self):
+        link = self.session()
+        data = bytes(range(256)) * 10
+        link.upload(3, data)
+        self.assertEqual(link.list_slots(), [(3, len(data), sp.crc32(data))])
+        self.assertEqual(link.read_slot(3), data)
+
+
+if __name__ == "__main__":
+    unittest.main()